@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from catalog import result_datasets, timeout_seconds
+from datasets import read_dataset, dataset_version
+from metrics import timed
+from workers import run_all
+
+OPTIMALITY_STATISTICS = ['already_optimal', 'discovered_optimal', 'non_optimal_with_less_gas',
+                         'non_optimal_with_same_gas', 'no_solution_found']
+
+# Upper edges, in seconds, of the bins in which the per-contract times of a timeout run are counted: ten
+# per decade from 10 ms to 10^6 s
+SWEEP_TIME_EDGES = np.logspace(-2, 6, 81)
+
+# Per-(encoding, solver) optimality totals and timeout sweep curves, keyed by dataset name. Each row is
+# computed once per version of its dataset, so charts only pay for a lookup regardless of the number of
+# contracts.
+_rows = {}
+_sweep_rows = {}
+_lock = threading.Lock()
+
+
+def _optimality_row(encoding, solver, df):
+    totals = df[OPTIMALITY_STATISTICS].sum()
+    total = totals.sum()
+    row = {'encoding': encoding, 'solver': solver, 'total': total}
+    for statistic in OPTIMALITY_STATISTICS:
+        row[statistic] = totals[statistic]
+        row[statistic + '_percentage'] = (totals[statistic] * 100) / total
+    return row
+
+
+def _compute_row(encoding, solver):
+    df = read_dataset(encoding + "_" + solver, OPTIMALITY_STATISTICS)
+    with timed("pandas"):
+        return _optimality_row(encoding, solver, df)
+
+
+def _compute_sweep_row(encoding, solver):
+    df = read_dataset(encoding + "_" + solver, ['time', 'saved_gas'] + OPTIMALITY_STATISTICS)
+    with timed("pandas"):
+        times = df['time'].to_numpy(dtype=float)
+        # Bin i holds the contracts with SWEEP_TIME_EDGES[i - 1] < time <= SWEEP_TIME_EDGES[i]. Contracts
+        # above the last edge or without a time fall in the extra bin at the end, which no curve reaches.
+        bins = np.searchsorted(SWEEP_TIME_EDGES, times)
+        contracts = np.bincount(bins, minlength=len(SWEEP_TIME_EDGES) + 1)[:len(SWEEP_TIME_EDGES)]
+        totals = df[OPTIMALITY_STATISTICS].sum()
+        solved = totals['already_optimal'] + totals['discovered_optimal']
+        return {'encoding': encoding, 'solver': solver, 'timeout': timeout_seconds(encoding),
+                'contracts': len(df), 'saved_gas': df['saved_gas'].sum(),
+                'solved_percentage': solved * 100 / totals.sum() if totals.sum() else 0.0,
+                'contracts_within': np.cumsum(contracts) * 100 / max(len(df), 1)}
+
+
+def _cached_rows(cache, compute, pairs):
+    # Rows of every (encoding, solver) pair, as computed by compute. The rows missing from the cache are
+    # computed concurrently, in worker processes when SYRUP_WORKER_PROCESSES is set.
+    pairs = list(pairs)
+    names = [encoding + "_" + solver for encoding, solver in pairs]
+    versions = [dataset_version(name) for name in names]
+    with _lock:
+        entries = [cache.get(name) for name in names]
+    rows = [entry[1] if entry is not None and entry[0] == version else None
+            for entry, version in zip(entries, versions)]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    computed = run_all(compute, [pairs[i] for i in missing], kind="processes")
+    with _lock:
+        for i, row in zip(missing, computed):
+            cache[names[i]] = (versions[i], row)
+            rows[i] = row
+    return rows
+
+
+def optimality_rows(pairs):
+    # Optimality totals of every (encoding, solver) pair
+    return _cached_rows(_rows, _compute_row, pairs)
+
+
+def sweep_rows(pairs):
+    # Summary of every (timeout, solver) run: percentage of blocks solved to optimality, total saved gas,
+    # and the cumulative percentage of contracts whose time is within each of SWEEP_TIME_EDGES
+    return _cached_rows(_sweep_rows, _compute_sweep_row, pairs)
+
+
+def optimality_totals(encoding, solver):
+    return optimality_rows([(encoding, solver)])[0]
+
+
+def optimality_table():
+    # Tidy table with one row per (encoding, solver): the count of every optimality statistic, their total
+    # and the percentage of each statistic
+    return pd.DataFrame(optimality_rows(result_datasets())).set_index(['encoding', 'solver'])
+
+
+def clear_cache():
+    with _lock:
+        _rows.clear()
+        _sweep_rows.clear()
@@ -1,18 +1,38 @@
 #!/usr/bin/python3
 # Import required libraries
 
-from plots import *
+import math
+import threading
+import time
+
+from plots import (encoding_names, optimality_names, placeholder_figure, plot_bar_comparison, plot_comparison,
+                   plot_configuration_comparison, plot_gas, plot_statistics, plot_statistics_pie_chart, plot_time,
+                   plot_time_ecdf, plot_timeout_sweep, solver_name, statistics_pairs)
+from aggregates import optimality_table
+from catalog import blocks_name, catalog_version, compared_encodings, result_datasets, timeout_seconds
+from compression import compress_response
+from drilldown import BLOCK_COLUMNS, CONTRACT_COLUMNS, block_datasets, disassembly, page
+from datasets import preload
+from figure_cache import cached_figure
+from jobs import JobManager, checked_by, job_info, run_steps
+from metrics import instrument_callback
+from settings import BACKGROUND_CALLBACKS, COMPRESS_RESPONSES, JOB_POLL_MILLISECONDS, PRELOAD_DATA
+from watcher import ensure_started
 import dash
-from dash.dependencies import Input, Output
+import datasets
+import figure_cache
+import flask
+import metrics
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+from dash import dash_table
 from dash import dcc
 from dash import html
-
-# get relative data folder
-PATH = pathlib.Path(__file__).parent
-DATA_PATH = (PATH.joinpath("data")).resolve()
+from plotly.io.json import to_json_plotly
 
 app = dash.Dash(
-    __name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}]
+    __name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}],
+    background_callback_manager=JobManager()
 )
 
 labels_configuration = {'init': 'Initial program length <= 15', 'size_relation':
@@ -26,32 +46,153 @@ labels_configuration_split = {'init': 'Initial program length <= 15', 'size_rela
                         'uninterpreted_per_initial': 'Relation between number of necessary uninterpreted instructions '
                                                      '<br>and initial program length >= 0.25'}
 
+solver_options = [
+    {'label': 'Portfolio results', 'value': 'combined'},
+    {'label': 'Barcelogic', 'value': 'barcelogic'},
+    {'label': 'Z3', 'value': 'z3'},
+    {'label': 'OptiMathSAT', 'value': 'oms'}
+]
+encoding_options = [
+    {'label': "Initial configuration",
+     'value': 'initial_configuration'},
+    {'label': 'Uninterpreted opcodes at most once ', 'value': 'at_most'},
+    {'label': 'Numerical values pushed at least once', 'value': 'pushed_once'},
+    {'label': 'Restricted opcodes before POP', 'value': 'no_output_before_pop'},
+    {'label': 'Other gas model', 'value': 'alternative_gas_model'},
+]
+final_encoding_options = [
+    {'label': 'Initial configuration', 'value': 'initial_configuration'},
+    {'label': 'Restricted opcodes before POP', 'value': 'no_output_before_pop'},
+    {'label': 'Final encoding (Rest. bef. POP + '
+              'Num. value once in certain situations)', 'value': 'final_encoding'}
+]
+compared_encoding_options = [
+    {'label': 'Rest. bef. POP + Unint. opcode at most',
+     'value': 'no_output_before_pop_at_most'},
+    {'label': 'Rest. bef. POP + Num. value once',
+     'value': 'no_output_before_pop_pushed_once'},
+    {'label': 'Rest. bef. POP + Unint. opcode at most + Num. value once',
+     'value': 'no_output_before_pop_at_most_pushed_once'},
+]
+timeout_options = [
+    {'label': '1 s', 'value': '1s'},
+    {'label': '10 s', 'value': '10s'},
+    {'label': '15 s', 'value': '15s'},
+    {'label': '30 s', 'value': '30s'},
+    {'label': '60 s', 'value': '60s'},
+]
+comparison_options = [
+    {'label': 'Initial program length', 'value': 'init_progr_len'},
+    {'label': 'Relation between program length lower bound and initial '
+              'program length', 'value': 'initial_size_relation'},
+    {'label': 'Number of necessary PUSHx instructions',
+     'value': 'number_of_necessary_push'},
+    {'label': 'Number of necessary uninterpreted instructions',
+     'value': 'number_of_necessary_uninterpreted_instructions'},
+    {'label': 'Relation between number of necessary PUSHx instructions and '
+              'initial program length', 'value': 'push_per_initial'},
+    {'label': 'Relation between number of necessary uninterpreted instructions and '
+              'initial program length', 'value': 'uninterpreted_per_initial'},
+    {'label': 'Relation between number of necessary PUSHx instructions and '
+              'program length lower bound', 'value': 'push_per_expected'},
+    {'label': 'Relation between number of necessary uninterpreted instructions and '
+              'program length lower bound', 'value': 'uninterpreted_per_expected'},
+]
+configuration_options = [
+    {'label': labels_configuration['init'], 'value': 'init'},
+    {'label': labels_configuration['size_relation'], 'value': 'size_relation'},
+    {'label': labels_configuration['number_push'], 'value': 'number_push'},
+    {'label': labels_configuration['uninterpreted_per_initial'],
+     'value': 'uninterpreted_per_initial'}
+]
+
+
+# Order in which the selected options are plotted
+solver_order = [option['value'] for option in solver_options]
+final_encoding_order = [option['value'] for option in final_encoding_options]
+encoding_order = ['initial_configuration', 'alternative_gas_model', 'at_most', 'pushed_once', 'no_output_before_pop']
+
+
+def in_canonical_order(values, order):
+    # Selections are put in a fixed order, so the same set of values always yields the same figure no
+    # matter the order in which they were clicked. Values found in data/ after startup go last.
+    return sorted(values, key=lambda value: (order.index(value), '') if value in order else (len(order), value))
+
+
+def option_values(options):
+    return [option['value'] for option in options]
+
+
+def timeout_order(timeouts):
+    # Order in which the selected timeouts are plotted, by their number of seconds
+    return sorted(timeouts, key=timeout_seconds)
+
+
+def dropdown_options():
+    # Options of the checklists, including the solvers, encodings and timeouts of any result file added to
+    # data/ that is not part of the study above. They are looked up every time the page is loaded.
+    known_solvers = [option['value'] for option in solver_options]
+    known_timeouts = [option['value'] for option in timeout_options]
+    # Encodings with a section of their own are not offered as new stage one encodings
+    known_encodings = set(encoding_names) | {'CAV'}
+    solvers = set()
+    encodings = set()
+    timeouts = set()
+    for encoding, solver in result_datasets():
+        solvers.add(solver)
+        if timeout_seconds(encoding) is not None:
+            timeouts.add(encoding)
+        elif encoding not in known_encodings:
+            encodings.add(encoding)
+    # Any encoding with per-block results can be compared on the fly against any other
+    labels = {option['value']: option['label'] for option in
+              encoding_options + final_encoding_options + compared_encoding_options}
+    compared = [{'label': labels.get(encoding, encoding), 'value': encoding} for encoding in compared_encodings()]
+    return {
+        'default_encoding': [option for option in compared if option['value'] == 'no_output_before_pop'] +
+                            [option for option in compared if blocks_name(option['value']) is not None and
+                             option['value'] != 'no_output_before_pop'],
+        'compared_encoding': compared_encoding_options +
+                             [option for option in compared if blocks_name(option['value']) is not None and
+                              option['value'] not in labels],
+        'solver': solver_options + [{'label': solver_name.get(solver, solver), 'value': solver}
+                                    for solver in sorted(solvers - set(known_solvers))],
+        'encoding': encoding_options + [{'label': encoding, 'value': encoding} for encoding in sorted(encodings)],
+        'final_encoding': final_encoding_options,
+        'block_dataset': [{'label': name, 'value': name} for name in block_datasets()],
+        'timeout': sorted(timeout_options + [{'label': timeout[:-1] + ' s', 'value': timeout}
+                                             for timeout in timeouts - set(known_timeouts)],
+                          key=lambda option: timeout_seconds(option['value'])),
+    }
+
+
 app.title = "Syrup Data Visualizer"
-# Create app layout
-app.layout = html.Div(
-    [
-        # empty Div to trigger javascript file for graph resizing
-        html.Div(id="output-clientside"),
-        html.Div(
-            [
-                html.Div(
-                    [
-                        html.H2(
-                            "Syrup Data Visualizer",
-                            style={"margin-bottom": "0px"},
-                        ),
-                        html.H4(
-                            "A detailed analysis on determining the best options for including Syrup in a compiler",
-                            style={"margin-top": "0px"}
-                        ),
-                    ]
-                )
-            ],
-            id="header",
-            style={"margin-bottom": "25px", "text-align": "center"}, ),
+
+# Column headers of the drill-down tables
+drill_down_names = {'name': "Contract", 'saved_gas_cav': "Saved gas 1.0", 'saved_gas_syrup': "Saved gas 2.0",
+                    'time_cav': "Time 1.0 (s)", 'time_syrup': "Time 2.0 (s)", 'time_regression': "Time regression (s)",
+                    'gas_regression': "Gas regression", 'block_id': "Block", 'solver_time_in_sec': "Solver time (s)",
+                    **optimality_names}
+DRILL_DOWN_PAGE_SIZE = 20
+# Stage two opens on the timeout sweep rather than on the boxes when data/ has more timeouts than this
+SWEEP_VIEW_TIMEOUTS = 10
+
+# Figure shown by the graphs of a section until it is opened and its figures are computed
+placeholder = placeholder_figure()
+progress_styles = ({"display": "block", "width": "50%", "margin": "10px auto 0"}, {"display": "none"})
+
+
+def progress_bar(section):
+    # Figures of the section built so far, shown while its background job runs
+    return html.Progress(id=section + "-progress", value=0, max=1, style=progress_styles[1])
+
+
+def stage_one_section(options):
+    return [
         html.Div(
             [
                 html.H3("Stage one: Determining the best encoding"),
+                progress_bar('encodings'),
             ],
             style={"margin-top": "25px", "margin-bottom": "25px", "text-align": "center"},
         ),
@@ -68,12 +209,7 @@ app.layout = html.Div(
                         html.H5("Choose solver option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.Checklist(
-                            options=[
-                                {'label': 'Portfolio results', 'value': 'combined'},
-                                {'label': 'Barcelogic', 'value': 'barcelogic'},
-                                {'label': 'Z3', 'value': 'z3'},
-                                {'label': 'OptiMathSAT', 'value': 'oms'}
-                            ],
+                            options=options['solver'],
                             value=['combined', 'barcelogic', 'z3', 'oms'],
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
@@ -83,16 +219,8 @@ app.layout = html.Div(
                         html.H5("Choose encoding option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.Checklist(
-                            options=[
-                                {'label': "Initial configuration",
-                                 'value': 'initial_configuration'},
-                                {'label': 'Uninterpreted opcodes at most once ', 'value': 'at_most'},
-                                {'label': 'Numerical values pushed at least once', 'value': 'pushed_once'},
-                                {'label': 'Restricted opcodes before POP', 'value': 'no_output_before_pop'},
-                                {'label': 'Other gas model', 'value': 'alternative_gas_model'},
-                            ],
-                            value=['initial_configuration', 'alternative_gas_model', 'at_most',
-                                   'pushed_once', 'no_output_before_pop'],
+                            options=options['encoding'],
+                            value=encoding_order,
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
                             inputStyle={"margin-right": "5px"},
@@ -102,7 +230,7 @@ app.layout = html.Div(
                     className="pretty_container five columns"),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='encoding-time'))
+                        dcc.Loading(dcc.Graph(id='encoding-time', figure=placeholder))
                     ],
                     className="pretty_container seven columns"),
             ],
@@ -112,19 +240,24 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='encoding-statistics'))
+                        dcc.Loading(dcc.Graph(id='encoding-statistics', figure=placeholder))
                     ],
                     className="pretty_container five columns"
                 ),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='encoding-gas'))
+                        dcc.Loading(dcc.Graph(id='encoding-gas', figure=placeholder))
                     ],
                     className="pretty_container seven columns"
                 ),
             ],
             className="row flex-display",
         ),
+    ]
+
+
+def parameters_section(options):
+    return [
         html.Div(
             [
                 html.H4("1.2 Determine possible parameters that affect the encoding"),
@@ -134,18 +267,22 @@ app.layout = html.Div(
         html.Div(
             [
                 html.Div([
-                    html.H5("Choose category to compare against no output before pop:",
+                    html.H5("Choose default encoding:",
                             style={"margin-top": "15px", "margin-bottom": "10px",
                                    "text-align": "center"}),
                     dcc.RadioItems(
-                        options=[
-                            {'label': 'Rest. bef. POP + Unint. opcode at most',
-                             'value': 'no_output_before_pop_at_most'},
-                            {'label': 'Rest. bef. POP + Num. value once',
-                             'value': 'no_output_before_pop_pushed_once'},
-                            {'label': 'Rest. bef. POP + Unint. opcode at most + Num. value once',
-                             'value': 'no_output_before_pop_at_most_pushed_once'},
-                        ],
+                        options=options['default_encoding'],
+                        value='no_output_before_pop',
+                        labelStyle={'display': 'inline-block', 'margin-left': '20px'},
+                        style={'text-align': "center"},
+                        inputStyle={"margin-right": "5px"},
+                        id='category_0'
+                    ),
+                    html.H5("Choose category to compare against the default encoding:",
+                            style={"margin-top": "15px", "margin-bottom": "10px",
+                                   "text-align": "center"}),
+                    dcc.RadioItems(
+                        options=options['compared_encoding'],
                         value='no_output_before_pop_at_most_pushed_once',
                         labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                         style={'text-align': "center"},
@@ -155,23 +292,7 @@ app.layout = html.Div(
                     html.H5("Choose comparison filter:",
                             style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                     dcc.RadioItems(
-                        options=[
-                            {'label': 'Initial program length', 'value': 'init_progr_len'},
-                            {'label': 'Relation between program length lower bound and initial '
-                                      'program length', 'value': 'initial_size_relation'},
-                            {'label': 'Number of necessary PUSHx instructions',
-                             'value': 'number_of_necessary_push'},
-                            {'label': 'Number of necessary uninterpreted instructions',
-                             'value': 'number_of_necessary_uninterpreted_instructions'},
-                            {'label': 'Relation between number of necessary PUSHx instructions and '
-                                      'initial program length', 'value': 'push_per_initial'},
-                            {'label': 'Relation between number of necessary uninterpreted instructions and '
-                                      'initial program length', 'value': 'uninterpreted_per_initial'},
-                            {'label': 'Relation between number of necessary PUSHx instructions and '
-                                      'program length lower bound', 'value': 'push_per_expected'},
-                            {'label': 'Relation between number of necessary uninterpreted instructions and '
-                                      'program length lower bound', 'value': 'uninterpreted_per_expected'},
-                        ],
+                        options=comparison_options,
                         value='init_progr_len',
                         labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                         style={'text-align': "center"},
@@ -184,12 +305,17 @@ app.layout = html.Div(
                     [
                         html.H4("Comparison between two encodings according to static parameters",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
-                        dcc.Loading(dcc.Graph(id='comparison-times'))
+                        dcc.Loading(dcc.Graph(id='comparison-times', figure=placeholder))
                     ],
                     className="pretty_container seven columns"),
             ],
             className="row flex-display",
         ),
+    ]
+
+
+def configurations_section(options):
+    return [
         html.Div(
             [
                 html.H4("1.3 Study configurations in which selected encoding seems to work better"),
@@ -203,13 +329,7 @@ app.layout = html.Div(
                         html.H5("Choose configuration option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.RadioItems(
-                            options=[
-                                {'label': labels_configuration['init'], 'value': 'init'},
-                                {'label': labels_configuration['size_relation'], 'value': 'size_relation'},
-                                {'label': labels_configuration['number_push'], 'value': 'number_push'},
-                                {'label': labels_configuration['uninterpreted_per_initial'],
-                                 'value': 'uninterpreted_per_initial'}
-                            ],
+                            options=configuration_options,
                             value='init',
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
@@ -220,15 +340,21 @@ app.layout = html.Div(
                     className="pretty_container five columns"),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='comparison-total-time'))
+                        dcc.Loading(dcc.Graph(id='comparison-total-time', figure=placeholder))
                     ],
                     className="pretty_container seven columns"),
             ],
             className="row flex-display",
         ),
+    ]
+
+
+def final_comparison_section(options):
+    return [
         html.Div(
             [
                 html.H3("1.4 Final comparison between different steps"),
+                progress_bar('final-comparison'),
             ],
             style={"margin-top": "25px", "margin-bottom": "25px", "text-align": "center"},
         ),
@@ -239,12 +365,7 @@ app.layout = html.Div(
                         html.H5("Choose solver option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.Checklist(
-                            options=[
-                                {'label': 'Portfolio results', 'value': 'combined'},
-                                {'label': 'Barcelogic', 'value': 'barcelogic'},
-                                {'label': 'Z3', 'value': 'z3'},
-                                {'label': 'OptiMathSAT', 'value': 'oms'}
-                            ],
+                            options=options['solver'],
                             value=['combined', 'barcelogic', 'z3', 'oms'],
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
@@ -254,12 +375,7 @@ app.layout = html.Div(
                         html.H5("Choose encoding option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.Checklist(
-                            options=[
-                                {'label': 'Initial configuration', 'value': 'initial_configuration'},
-                                {'label': 'Restricted opcodes before POP', 'value': 'no_output_before_pop'},
-                                {'label': 'Final encoding (Rest. bef. POP + '
-                                          'Num. value once in certain situations)', 'value': 'final_encoding'}
-                            ],
+                            options=options['final_encoding'],
                             value=['initial_configuration', 'no_output_before_pop', 'final_encoding'],
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
@@ -270,7 +386,7 @@ app.layout = html.Div(
                     className="pretty_container five columns"),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='time-final-stage-one'))
+                        dcc.Loading(dcc.Graph(id='time-final-stage-one', figure=placeholder))
                     ],
                     className="pretty_container seven columns"),
             ],
@@ -280,22 +396,28 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='statistics-final-stage-one'))
+                        dcc.Loading(dcc.Graph(id='statistics-final-stage-one', figure=placeholder))
                     ],
                     className="pretty_container five columns"
                 ),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='gas-final-stage-one'))
+                        dcc.Loading(dcc.Graph(id='gas-final-stage-one', figure=placeholder))
                     ],
                     className="pretty_container seven columns"
                 ),
             ],
             className="row flex-display",
         ),
+    ]
+
+
+def stage_two_section(options):
+    return [
         html.Div(
             [
                 html.H3("Stage two: Determining the most suitable timeout"),
+                progress_bar('stage-two'),
             ],
             style={"margin-top": "25px", "margin-bottom": "25px", "text-align": "center"},
         ),
@@ -306,12 +428,7 @@ app.layout = html.Div(
                         html.H5("Choose solver option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.Checklist(
-                            options=[
-                                {'label': 'Portfolio results', 'value': 'combined'},
-                                {'label': 'Barcelogic', 'value': 'barcelogic'},
-                                {'label': 'Z3', 'value': 'z3'},
-                                {'label': 'OptiMathSAT', 'value': 'oms'}
-                            ],
+                            options=options['solver'],
                             value=['combined', 'barcelogic', 'z3', 'oms'],
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
@@ -321,24 +438,29 @@ app.layout = html.Div(
                         html.H5("Choose timeout option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.Checklist(
-                            options=[
-                                {'label': '1 s', 'value': '1s'},
-                                {'label': '10 s', 'value': '10s'},
-                                {'label': '15 s', 'value': '15s'},
-                                {'label': '30 s', 'value': '30s'},
-                                {'label': '60 s', 'value': '60s'},
-                            ],
-                            value=['1s', '10s', '15s', '30s', '60s'],
+                            options=options['timeout'],
+                            value=option_values(options['timeout']),
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
                             inputStyle={"margin-right": "5px"},
                             id='timeout-stage-two'
                         ),
+                        html.H5("Choose view:",
+                                style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
+                        dcc.RadioItems(
+                            options=[{'label': 'Distributions per timeout', 'value': 'boxes'},
+                                     {'label': 'Timeout sweep', 'value': 'sweep'}],
+                            value='sweep' if len(options['timeout']) > SWEEP_VIEW_TIMEOUTS else 'boxes',
+                            labelStyle={'display': 'inline-block', 'margin-left': '20px'},
+                            style={'text-align': "center"},
+                            inputStyle={"margin-right": "5px"},
+                            id='view-stage-two'
+                        ),
                     ],
                     className="pretty_container five columns"),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='encoding-time-stage-two'))
+                        dcc.Loading(dcc.Graph(id='encoding-time-stage-two', figure=placeholder))
                     ],
                     className="pretty_container seven columns"),
             ],
@@ -348,22 +470,28 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='encoding-statistics-stage-two'))
+                        dcc.Loading(dcc.Graph(id='encoding-statistics-stage-two', figure=placeholder))
                     ],
                     className="pretty_container five columns"
                 ),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='encoding-gas-stage-two'))
+                        dcc.Loading(dcc.Graph(id='encoding-gas-stage-two', figure=placeholder))
                     ],
                     className="pretty_container seven columns"
                 ),
             ],
             className="row flex-display",
         ),
+    ]
+
+
+def stage_three_section(options):
+    return [
         html.Div(
             [
                 html.H3("Stage three: Comparison with CAV benchmark"),
+                progress_bar('stage-three'),
             ],
             style={"margin-top": "25px", "margin-bottom": "25px", "text-align": "center"},
         ),
@@ -374,12 +502,7 @@ app.layout = html.Div(
                         html.H5("Choose solver option:",
                                 style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
                         dcc.RadioItems(
-                            options=[
-                                {'label': 'Portfolio results', 'value': 'combined'},
-                                {'label': 'Barcelogic', 'value': 'barcelogic'},
-                                {'label': 'Z3', 'value': 'z3'},
-                                {'label': 'OptiMathSAT', 'value': 'oms'}
-                            ],
+                            options=options['solver'],
                             value='combined',
                             labelStyle={'display': 'inline-block', 'margin-left': '20px'},
                             style={'text-align': "center"},
@@ -390,7 +513,7 @@ app.layout = html.Div(
                     className="pretty_container five columns"),
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='statistics-stage-three'))
+                        dcc.Loading(dcc.Graph(id='statistics-stage-three', figure=placeholder))
                     ],
                     className="pretty_container seven columns"),
             ],
@@ -400,7 +523,7 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='gas-comparison-stage-three'))
+                        dcc.Loading(dcc.Graph(id='gas-comparison-stage-three', figure=placeholder))
                     ],
                     className="pretty_container twelve columns"
                 ),
@@ -411,72 +534,427 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        dcc.Loading(dcc.Graph(id='time-comparison-stage-three'))
+                        dcc.Loading(dcc.Graph(id='time-comparison-stage-three', figure=placeholder))
                     ],
                     className="pretty_container twelve columns"
                 ),
             ],
             className="row flex-display",
         ),
-    ],
-    id="mainContainer",
-    style={"display": "flex", "flex-direction": "column"},
-)
+    ]
 
 
-@app.callback([Output('encoding-time', 'figure'), Output('encoding-gas', 'figure'),
-               Output('encoding-statistics', 'figure')],
-              [Input('solver', 'value'), Input('encoding', 'value')])
-def update_stage_one(selected_solvers, selected_encodings):
-    time_figure = plot_time(selected_solvers, selected_encodings)
-    gas_figure = plot_gas(selected_solvers, selected_encodings)
-    statistics_figure = plot_statistics(selected_solvers, selected_encodings)
-    return time_figure, gas_figure, statistics_figure
 
+def drill_down_section(options):
+    return [
+        html.Div(
+            [
+                html.H3("Drill-down: results per contract and per block"),
+            ],
+            style={"margin-top": "25px", "margin-bottom": "25px", "text-align": "center"},
+        ),
+        html.Div(
+            [
+                html.Div(
+                    [
+                        html.H5("Choose solver option:",
+                                style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
+                        dcc.RadioItems(
+                            options=options['solver'],
+                            value='combined',
+                            labelStyle={'display': 'inline-block', 'margin-left': '20px'},
+                            style={'text-align': "center"},
+                            inputStyle={"margin-right": "5px"},
+                            id='solver-drill-down'
+                        ),
+                        html.H5("Filter by contract name:",
+                                style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
+                        dcc.Input(id='contract-filter', type='text', debounce=True, placeholder="0x...",
+                                  style={'width': '100%'}),
+                    ],
+                    className="pretty_container three columns"),
+                html.Div(
+                    [
+                        html.H5("Syrup 1.0 (CAV'20 setup) against syrup 2.0 (final setup), per contract",
+                                style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
+                        dash_table.DataTable(
+                            id='contract-table',
+                            columns=[{'name': drill_down_names.get(column, column), 'id': column}
+                                     for column in CONTRACT_COLUMNS],
+                            page_action='custom', page_current=0, page_size=DRILL_DOWN_PAGE_SIZE,
+                            sort_action='custom', sort_mode='single',
+                            sort_by=[{'column_id': 'time_regression', 'direction': 'desc'}],
+                            style_table={'overflowX': 'auto'},
+                        ),
+                    ],
+                    className="pretty_container nine columns"),
+            ],
+            className="row flex-display",
+        ),
+        html.Div(
+            [
+                html.Div(
+                    [
+                        html.H5("Choose per-block dataset:",
+                                style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
+                        dcc.Dropdown(
+                            options=options['block_dataset'],
+                            value=options['block_dataset'][0]['value'] if options['block_dataset'] else None,
+                            clearable=False,
+                            id='block-dataset'
+                        ),
+                        html.H5("Filter by block id:",
+                                style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
+                        dcc.Input(id='block-filter', type='text', debounce=True, style={'width': '100%'}),
+                        html.H5("Disassembly of the selected block:",
+                                style={"margin-top": "15px", "margin-bottom": "10px", "text-align": "center"}),
+                        html.Pre(id='block-disassembly', style={'white-space': 'pre-wrap'}),
+                    ],
+                    className="pretty_container three columns"),
+                html.Div(
+                    [
+                        dash_table.DataTable(
+                            id='block-table',
+                            columns=[{'name': drill_down_names.get(column, column), 'id': column}
+                                     for column in BLOCK_COLUMNS],
+                            page_action='custom', page_current=0, page_size=DRILL_DOWN_PAGE_SIZE,
+                            sort_action='custom', sort_mode='single',
+                            sort_by=[{'column_id': 'saved_gas', 'direction': 'desc'}],
+                            style_table={'overflowX': 'auto'},
+                        ),
+                    ],
+                    className="pretty_container nine columns"),
+            ],
+            className="row flex-display",
+        ),
+    ]
+
+
+# (value, label, layout) of every tab. The callbacks of a section only run while its tab is open.
+sections = [('encodings', "1.1 Encodings", stage_one_section),
+            ('parameters', "1.2 Encoding parameters", parameters_section),
+            ('configurations', "1.3 Configurations", configurations_section),
+            ('final-comparison', "1.4 Final comparison", final_comparison_section),
+            ('stage-two', "Stage two: Timeouts", stage_two_section),
+            ('stage-three', "Stage three: CAV benchmark", stage_three_section),
+            ('drill-down', "Drill-down", drill_down_section)]
+
+
+# Create app layout
+def build_layout():
+    options = dropdown_options()
+    return html.Div(
+        [
+            # empty Div to trigger javascript file for graph resizing
+            html.Div(id="output-clientside"),
+            html.Div(
+                [
+                    html.Div(
+                        [
+                            html.H2(
+                                "Syrup Data Visualizer",
+                                style={"margin-bottom": "0px"},
+                            ),
+                            html.H4(
+                                "A detailed analysis on determining the best options for including Syrup in a compiler",
+                                style={"margin-top": "0px"}
+                            ),
+                        ]
+                    )
+                ],
+                id="header",
+                style={"margin-bottom": "25px", "text-align": "center"}, ),
+            dcc.Tabs(
+                [dcc.Tab(section(options), label=label, value=value) for value, label, section in sections],
+                id="section",
+                value="encodings",
+            ),
+            # Inputs the figures of every section were last computed for
+            *[dcc.Store(id=value + "-rendered") for value, _, _ in sections],
+            # Every trace of the sections whose selections are applied in the browser
+            *[dcc.Store(id=value + "-figures") for value in ('encodings', 'final-comparison', 'stage-two')],
+        ],
+        id="mainContainer",
+        style={"display": "flex", "flex-direction": "column"},
+    )
+
+
+# The layout only changes with the datasets listed by the catalog, whose solvers, encodings and timeouts fill its
+# options, so it is built and serialized once per catalog version and the same JSON is sent to every page load.
+# Dash builds it a first time when app.layout is set, to validate the callbacks against it.
+_layout = {}
+_layout_lock = threading.Lock()
+
+
+def cached_layout():
+    # (layout, layout serialized) for the current catalog version
+    version = catalog_version()
+    with _layout_lock:
+        if _layout.get("version") != version:
+            layout = build_layout()
+            _layout.update(version=version, layout=layout, json=to_json_plotly(layout))
+        return _layout["layout"], _layout["json"]
+
+
+def serve_layout():
+    return cached_layout()[0]
+
+
+app.layout = serve_layout
+
+
+def check_section(section, expected, rendered, inputs):
+    # Callbacks of hidden sections, and those fired when opening a section that already shows the figures
+    # of its current inputs, do not compute anything. The sections computed by background jobs check it with
+    # the <section>_inputs functions before submitting the job too.
+    if section != expected or rendered == inputs:
+        raise PreventUpdate
+
+
+def background(section):
+    # Arguments of the callbacks of sections whose figures are computed by background jobs (see jobs.py), polled
+    # by the browser, which shows the figures built so far in the progress bar of the section
+    progress = section + "-progress"
+    return {'background': BACKGROUND_CALLBACKS, 'interval': JOB_POLL_MILLISECONDS,
+            'progress': [Output(progress, 'value'), Output(progress, 'max')],
+            'running': [(Output(progress, 'style'), *progress_styles)]}
+
+
+# How assets/filter_script.js selects the traces of the figures of each plot function
+trace_kinds = {plot_time: 'boxes', plot_gas: 'boxes', plot_statistics: 'bars', plot_timeout_sweep: 'lines',
+               plot_time_ecdf: 'lines'}
+
+
+def trace_set(solvers, encodings, plot_functions=(plot_time, plot_gas, plot_statistics)):
+    # Figures of every solver and encoding of a section, sent once to the browser together with what
+    # assets/filter_script.js needs to show any selection of them without asking the server again
+    figures = run_steps(cached_figure, [(plot_function, solvers, encodings) for plot_function in plot_functions])
+    return {'figures': figures, 'kinds': [trace_kinds[plot_function] for plot_function in plot_functions],
+            **trace_labels(solvers, encodings)}
 
-@app.callback(Output('comparison-times', 'figure'),
-              [Input('category_1', 'value'), Input('comparison', 'value')])
-def update_comparison(category, comparison):
-    return plot_comparison("no_output_before_pop", category, comparison)
 
+def trace_labels(solvers, encodings):
+    # Encoding of every box trace, label of every solver in the x axis of the boxes, and (encoding, solver)
+    # of every bar of the statistics, which is how assets/filter_script.js finds the selected ones
+    return {'encodings': encodings, 'solver_labels': {solver: solver_name.get(solver, solver) for solver in solvers},
+            'pairs': statistics_pairs(solvers, encodings)}
 
-@app.callback(Output('comparison-total-time', 'figure'), Input('configuration-selection', 'value'))
-def update_configuration_study(selected_parameter):
-    return plot_configuration_comparison(selected_parameter)
 
+def stage_one_inputs(section, solver_options, encoding_options, rendered):
+    # Inputs of the figures of the section, checked with check_section
+    solvers = in_canonical_order(option_values(solver_options), solver_order)
+    encodings = in_canonical_order(option_values(encoding_options), encoding_order)
+    inputs = [solvers, encodings]
+    check_section(section, 'encodings', rendered, inputs)
+    return inputs
 
-@app.callback([Output('time-final-stage-one', 'figure'), Output('gas-final-stage-one', 'figure'),
-               Output('statistics-final-stage-one', 'figure')],
-              [Input('solver-final-stage-one', 'value'), Input('encoding-final-stage-one', 'value')])
-def update_stage_one_final_comparison(selected_solvers, selected_encodings):
-    time_figure = plot_time(selected_solvers, selected_encodings)
-    gas_figure = plot_gas(selected_solvers, selected_encodings)
-    statistics_figure = plot_statistics(selected_solvers, selected_encodings)
-    return time_figure, gas_figure, statistics_figure
 
+@app.callback([Output('encodings-figures', 'data'), Output('encodings-rendered', 'data')],
+              [Input('section', 'value'), Input('solver', 'options'), Input('encoding', 'options')],
+              State('encodings-rendered', 'data'), **background('encodings'))
+@instrument_callback
+@checked_by(stage_one_inputs)
+def update_stage_one(section, solver_options, encoding_options, rendered):
+    solvers, encodings = inputs = stage_one_inputs(section, solver_options, encoding_options, rendered)
+    return trace_set(solvers, encodings), inputs
 
-@app.callback([Output('encoding-time-stage-two', 'figure'), Output('encoding-gas-stage-two', 'figure'),
-               Output('encoding-statistics-stage-two', 'figure')],
-              [Input('solver-stage-two', 'value'), Input('timeout-stage-two', 'value')])
-def update_stage_two(selected_solvers, selected_timeout):
-    selected_timeout = sorted(selected_timeout, key=lambda t: t[:-1])
-    time_figure = plot_time(selected_solvers, selected_timeout)
-    gas_figure = plot_gas(selected_solvers, selected_timeout)
-    statistics_figure = plot_statistics(selected_solvers, selected_timeout)
-    return time_figure, gas_figure, statistics_figure
+
+app.clientside_callback(
+    ClientsideFunction(namespace='filtering', function_name='selectTraces'),
+    [Output('encoding-time', 'figure'), Output('encoding-gas', 'figure'), Output('encoding-statistics', 'figure')],
+    [Input('solver', 'value'), Input('encoding', 'value'), Input('encodings-figures', 'data')])
+
+
+@app.callback([Output('comparison-times', 'figure'), Output('parameters-rendered', 'data')],
+              [Input('section', 'value'), Input('category_0', 'value'), Input('category_1', 'value'),
+               Input('comparison', 'value')],
+              State('parameters-rendered', 'data'))
+@instrument_callback
+def update_comparison(section, default_category, category, comparison, rendered):
+    inputs = [default_category, category, comparison]
+    check_section(section, 'parameters', rendered, inputs)
+    return cached_figure(plot_comparison, default_category, category, comparison), inputs
+
+
+@app.callback([Output('comparison-total-time', 'figure'), Output('configurations-rendered', 'data')],
+              [Input('section', 'value'), Input('configuration-selection', 'value')],
+              State('configurations-rendered', 'data'))
+@instrument_callback
+def update_configuration_study(section, selected_parameter, rendered):
+    inputs = [selected_parameter]
+    check_section(section, 'configurations', rendered, inputs)
+    return cached_figure(plot_configuration_comparison, selected_parameter), inputs
+
+
+def final_comparison_inputs(section, solver_options, encoding_options, rendered):
+    solvers = in_canonical_order(option_values(solver_options), solver_order)
+    encodings = in_canonical_order(option_values(encoding_options), final_encoding_order)
+    inputs = [solvers, encodings]
+    check_section(section, 'final-comparison', rendered, inputs)
+    return inputs
+
+
+@app.callback([Output('final-comparison-figures', 'data'), Output('final-comparison-rendered', 'data')],
+              [Input('section', 'value'), Input('solver-final-stage-one', 'options'),
+               Input('encoding-final-stage-one', 'options')],
+              State('final-comparison-rendered', 'data'), **background('final-comparison'))
+@instrument_callback
+@checked_by(final_comparison_inputs)
+def update_stage_one_final_comparison(section, solver_options, encoding_options, rendered):
+    solvers, encodings = inputs = final_comparison_inputs(section, solver_options, encoding_options, rendered)
+    return trace_set(solvers, encodings), inputs
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='filtering', function_name='selectTraces'),
+    [Output('time-final-stage-one', 'figure'), Output('gas-final-stage-one', 'figure'),
+     Output('statistics-final-stage-one', 'figure')],
+    [Input('solver-final-stage-one', 'value'), Input('encoding-final-stage-one', 'value'),
+     Input('final-comparison-figures', 'data')])
+
+
+def stage_two_inputs(section, view, solver_options, timeout_options, rendered):
+    solvers = in_canonical_order(option_values(solver_options), solver_order)
+    timeouts = timeout_order(option_values(timeout_options))
+    inputs = [view, solvers, timeouts]
+    check_section(section, 'stage-two', rendered, inputs)
+    return inputs
+
+
+@app.callback([Output('stage-two-figures', 'data'), Output('stage-two-rendered', 'data')],
+              [Input('section', 'value'), Input('view-stage-two', 'value'), Input('solver-stage-two', 'options'),
+               Input('timeout-stage-two', 'options')],
+              State('stage-two-rendered', 'data'), **background('stage-two'))
+@instrument_callback
+@checked_by(stage_two_inputs)
+def update_stage_two(section, view, solver_options, timeout_options, rendered):
+    view, solvers, timeouts = inputs = stage_two_inputs(section, view, solver_options, timeout_options, rendered)
+    if view == 'sweep':
+        # In the places of the time and gas boxes
+        return trace_set(solvers, timeouts, (plot_timeout_sweep, plot_time_ecdf, plot_statistics)), inputs
+    return trace_set(solvers, timeouts), inputs
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='filtering', function_name='selectTraces'),
+    [Output('encoding-time-stage-two', 'figure'), Output('encoding-gas-stage-two', 'figure'),
+     Output('encoding-statistics-stage-two', 'figure')],
+    [Input('solver-stage-two', 'value'), Input('timeout-stage-two', 'value'), Input('stage-two-figures', 'data')])
+
+
+def stage_three_inputs(section, solver, rendered):
+    inputs = [solver]
+    check_section(section, 'stage-three', rendered, inputs)
+    return inputs
 
 
 @app.callback([Output('statistics-stage-three', 'figure'), Output('gas-comparison-stage-three', 'figure'),
-               Output('time-comparison-stage-three', 'figure')],
-              Input('solver-stage-three', 'value'))
-def update_stage_three(solver):
-    statistics_figure = plot_statistics_pie_chart(solver)
-    gas_figure = plot_bar_comparison(solver, "saved_gas")
-    time_figure = plot_bar_comparison(solver, "time")
-    return statistics_figure, gas_figure, time_figure
+               Output('time-comparison-stage-three', 'figure'), Output('stage-three-rendered', 'data')],
+              [Input('section', 'value'), Input('solver-stage-three', 'value')],
+              State('stage-three-rendered', 'data'), **background('stage-three'))
+@instrument_callback
+@checked_by(stage_three_inputs)
+def update_stage_three(section, solver, rendered):
+    inputs = stage_three_inputs(section, solver, rendered)
+    statistics_figure, gas_figure, time_figure = run_steps(cached_figure, [
+        (plot_statistics_pie_chart, solver), (plot_bar_comparison, solver, "saved_gas"),
+        (plot_bar_comparison, solver, "time")])
+    return statistics_figure, gas_figure, time_figure, inputs
+
+
+def sort_order(sort_by):
+    # (column, descending) of the sort_by property of a DataTable
+    if not sort_by:
+        return None, False
+    return sort_by[0]['column_id'], sort_by[0]['direction'] == 'desc'
+
+
+@app.callback([Output('contract-table', 'data'), Output('contract-table', 'page_count')],
+              [Input('section', 'value'), Input('solver-drill-down', 'value'), Input('contract-filter', 'value'),
+               Input('contract-table', 'page_current'), Input('contract-table', 'page_size'),
+               Input('contract-table', 'sort_by')])
+@instrument_callback
+def update_contract_table(section, solver, query, page_current, page_size, sort_by):
+    if section != 'drill-down':
+        raise PreventUpdate
+    rows, count = page(("contracts", solver), *sort_order(sort_by), page_current, page_size, query or "")
+    return rows, max(1, math.ceil(count / page_size))
+
+
+@app.callback([Output('block-table', 'data'), Output('block-table', 'page_count')],
+              [Input('section', 'value'), Input('block-dataset', 'value'), Input('block-filter', 'value'),
+               Input('block-table', 'page_current'), Input('block-table', 'page_size'),
+               Input('block-table', 'sort_by')])
+@instrument_callback
+def update_block_table(section, name, query, page_current, page_size, sort_by):
+    if section != 'drill-down' or name is None:
+        raise PreventUpdate
+    rows, count = page(("blocks", name), *sort_order(sort_by), page_current, page_size, query or "")
+    return rows, max(1, math.ceil(count / page_size))
+
+
+@app.callback(Output('block-disassembly', 'children'),
+              Input('block-table', 'active_cell'),
+              [State('block-table', 'data'), State('block-dataset', 'value')])
+@instrument_callback
+def update_block_disassembly(active_cell, rows, name):
+    if active_cell is None or not rows or active_cell['row'] >= len(rows):
+        return "Select a block of the table"
+    return disassembly(name, rows[active_cell['row']]['block_id']) or ""
 
 
 server = app.server
+server.before_request(ensure_started)
+
+
+@server.before_request
+def start_timer():
+    flask.g.request_start = time.perf_counter()
+
+
+@server.after_request
+def record_request(response):
+    # Latency (including Dash's own serialization) and payload size of every callback request
+    if flask.request.path.endswith("/_dash-update-component") and "request_start" in flask.g:
+        body = flask.request.get_json(silent=True) or {}
+        callback = app.callback_map.get(body.get("output"), {}).get("callback")
+        name = callback.__name__ if callback is not None else "unknown"
+        metrics.observe_histogram("syrup_request_seconds", time.perf_counter() - flask.g.request_start,
+                                  metrics.LATENCY_BUCKETS, callback=name)
+        metrics.observe_histogram("syrup_response_bytes", response.calculate_content_length() or 0,
+                                  metrics.SIZE_BUCKETS, callback=name)
+    return response
+
+
+def serve_metrics():
+    dataset_info = datasets.cache_info()
+    figure_info = figure_cache.cache_info()
+    job_counts = job_info()
+    gauges = [("syrup_dataset_cache", "Dataset cache counters",
+               {(("counter", key),): dataset_info[key] for key in ("hits", "misses", "entries", "bytes")}),
+              ("syrup_figure_cache", "Figure cache counters",
+               {(("counter", key),): figure_info[key] for key in ("hits", "disk_hits", "misses", "entries", "bytes")}),
+              ("syrup_jobs", "Background job counters",
+               {(("counter", key),): job_counts[key] for key in job_counts if key not in ("threads", "directory")}),
+              ("syrup_data_version", "Number of changes to data/ seen by the watcher",
+               {(): datasets.data_version()})]
+    return flask.Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+def serve_layout_json():
+    # Replaces the view of Dash, which serializes the whole layout again on every page load
+    return flask.Response(cached_layout()[1], mimetype="application/json")
+
+
+server.add_url_rule("/metrics", "metrics", serve_metrics)
+server.view_functions[app.config.routes_pathname_prefix + "_dash-layout"] = serve_layout_json
+if COMPRESS_RESPONSES:
+    # Registered last so that it runs first and record_request sees the size sent over the wire
+    server.after_request(compress_response)
+
+if PRELOAD_DATA:
+    preload()
+    optimality_table()
 
 # Main
 if __name__ == "__main__":
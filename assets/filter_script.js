@@ -0,0 +1,101 @@
+if (!window.dash_clientside) {
+  window.dash_clientside = {};
+}
+
+// Keeps the entries of every array attribute of a trace whose position passes keep
+function filterTrace(trace, attributes, keep) {
+  var filtered = Object.assign({}, trace);
+  attributes.forEach(function(attribute) {
+    if (Array.isArray(trace[attribute])) {
+      filtered[attribute] = trace[attribute].filter(function(value, i) {
+        return keep(i);
+      });
+    }
+  });
+  return filtered;
+}
+
+// Boxes of plot_time and plot_gas: one trace per encoding, with a point (or the statistics of a box in
+// precomputed mode) per solver label in x
+var BOX_ATTRIBUTES = ['x', 'y', 'q1', 'median', 'q3', 'lowerfence', 'upperfence', 'mean'];
+
+function selectBoxes(figure, traceSet, solvers, encodings) {
+  var labels = new Set(solvers.map(function(solver) {
+    return traceSet.solver_labels[solver];
+  }));
+  var selectedEncodings = new Set(encodings);
+  var data = [];
+  figure.data.forEach(function(trace, i) {
+    if (!selectedEncodings.has(traceSet.encodings[i])) {
+      return;
+    }
+    var x = trace.x;
+    data.push(filterTrace(trace, BOX_ATTRIBUTES, function(j) {
+      return labels.has(x[j]);
+    }));
+  });
+  return {data: data, layout: figure.layout};
+}
+
+// Stacked bars of plot_statistics: one trace per statistic, with a bar per (encoding, solver) pair
+function selectBars(figure, traceSet, solvers, encodings) {
+  var selectedSolvers = new Set(solvers);
+  var selectedEncodings = new Set(encodings);
+  var keep = traceSet.pairs.map(function(pair) {
+    return selectedEncodings.has(pair[0]) && selectedSolvers.has(pair[1]);
+  });
+  var data = figure.data.map(function(trace) {
+    var filtered = filterTrace(trace, ['y'], function(j) {
+      return keep[j];
+    });
+    filtered.x = trace.x.map(function(level) {
+      return level.filter(function(value, j) {
+        return keep[j];
+      });
+    });
+    return filtered;
+  });
+  return {data: data, layout: figure.layout};
+}
+
+// Lines of plot_timeout_sweep (a line per solver with a point per timeout, named in customdata) and
+// plot_time_ecdf (a line per timeout and solver), which carry their solver and timeout in meta
+function selectLines(figure, traceSet, solvers, encodings) {
+  var selectedSolvers = new Set(solvers);
+  var selectedEncodings = new Set(encodings);
+  var data = [];
+  figure.data.forEach(function(trace) {
+    if (!selectedSolvers.has(trace.meta.solver)) {
+      return;
+    }
+    if (trace.meta.encoding !== undefined) {
+      if (selectedEncodings.has(trace.meta.encoding)) {
+        data.push(trace);
+      }
+      return;
+    }
+    var customdata = trace.customdata;
+    data.push(filterTrace(trace, ['x', 'y', 'customdata'], function(j) {
+      return selectedEncodings.has(customdata[j]);
+    }));
+  });
+  return {data: data, layout: figure.layout};
+}
+
+var SELECTORS = {boxes: selectBoxes, bars: selectBars, lines: selectLines};
+
+window.dash_clientside.filtering = {
+  // Figures of the selected solvers and encodings, cut from the trace set the server sent for the whole
+  // section (see trace_set in app.py)
+  selectTraces: function(solvers, encodings, traceSet) {
+    if (!traceSet) {
+      return [window.dash_clientside.no_update, window.dash_clientside.no_update,
+              window.dash_clientside.no_update];
+    }
+    solvers = solvers || [];
+    encodings = encodings || [];
+    return traceSet.figures.map(function(figure, i) {
+      return SELECTORS[traceSet.kinds[i]](figure, traceSet, solvers, encodings);
+    });
+  }
+};
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+# Micro-benchmark of the box plot assembly in plot_time/plot_gas: the previous np.append + list.extend loop
+# against plots.plot_metric, on synthetic results of 4 solvers x 5 encodings with 10k and 1M rows in total.
+#
+#   python3 benchmarks/box_assembly.py [--rows 10000 1000000] [--repeat 3]
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import plots
+
+SOLVERS = ['combined', 'barcelogic', 'z3', 'oms']
+ENCODINGS = ['initial_configuration', 'alternative_gas_model', 'at_most', 'pushed_once', 'no_output_before_pop']
+
+
+def synthetic_results(rows):
+    rng = np.random.default_rng(0)
+    per_file = max(rows // (len(SOLVERS) * len(ENCODINGS)), 1)
+    return {encoding + "_" + solver: pd.DataFrame({'time': rng.exponential(300, per_file)})
+            for encoding in ENCODINGS for solver in SOLVERS}
+
+
+def append_loop(results, folder_name, encodings):
+    # Assembly done by plot_time before plot_metric
+    fig = go.Figure()
+    for encoding in encodings:
+        times = np.empty(0, dtype=float)
+        labels = []
+        for name in folder_name:
+            arr = results[encoding + "_" + name]['time'].to_numpy() / 60
+            times = np.append(times, arr)
+            labels.extend([plots.solver_name[name]] * len(arr))
+        fig.add_trace(go.Box(y=times, x=labels, name=plots.encoding_names[encoding]))
+    return fig
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the assembly of the time/gas box plots")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for rows in args.rows:
+        results = synthetic_results(rows)
+        # plot_metric reads through the catalog and the dataset cache, which are replaced by the in-memory
+        # results here
+        plots.has_results = lambda encoding, solver: encoding + "_" + solver in results
+        plots.read_dataset = lambda name, columns=None: results[name] if columns is None else results[name][columns]
+        before = best_of(lambda: append_loop(results, SOLVERS, ENCODINGS), args.repeat)
+        after = best_of(lambda: plots.plot_metric(SOLVERS, ENCODINGS, 'time', '', scale=60), args.repeat)
+        print("{:>9} rows  append loop {:8.4f}s  plot_metric {:8.4f}s  speedup {:5.1f}x".format(
+            rows, before, after, before / after))
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# Size on the wire and latency of the update_stage_one response (the trace set of every solver and encoding),
+# uncompressed and with each encoding the server can compress with, including the polls of its background job.
+# The data can be scaled as in suite.py.
+#
+#   python3 benchmarks/callback_payload.py [--scale 10] [--repeat 20]
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+ACCEPT_ENCODINGS = ["identity", "gzip", "br"]
+
+
+def request_body(app):
+    outputs = [{"id": "encodings-figures", "property": "data"}, {"id": "encodings-rendered", "property": "data"}]
+    return {"output": "..encodings-figures.data...encodings-rendered.data..",
+            "outputs": outputs,
+            "inputs": [{"id": "section", "property": "value", "value": "encodings"},
+                       {"id": "solver", "property": "options",
+                        "value": [{"label": solver, "value": solver} for solver in app.solver_order]},
+                       {"id": "encoding", "property": "options",
+                        "value": [{"label": encoding, "value": encoding} for encoding in app.encoding_order]}],
+            "state": [{"id": "encodings-rendered", "property": "data", "value": None}],
+            "changedPropIds": ["section.value"]}
+
+
+def post_callback(client, body, headers):
+    # Response with the outputs of the callback, polling its background job (see jobs.py) until they are ready
+    response = client.post("/_dash-update-component", json=body, headers=headers)
+    job = response.get_json(silent=True) if "Content-Encoding" not in response.headers else None
+    if not job or "cacheKey" not in job:
+        return response
+    path = "/_dash-update-component?cacheKey={}&job={}".format(job["cacheKey"], job["job"])
+    while response.status_code == 200 and "Content-Encoding" not in response.headers and \
+            "response" not in response.get_json():
+        time.sleep(0.005)
+        response = client.post(path, json=body, headers=headers)
+    return response
+
+
+def measure(repeat):
+    # Runs in a fresh interpreter whose SYRUP_DATA_PATH points to the data to measure
+    import app
+    import figure_cache
+    client = app.server.test_client()
+    body = request_body(app)
+    results = {}
+    for accept_encoding in ACCEPT_ENCODINGS:
+        headers = {"Accept-Encoding": accept_encoding}
+        figure_cache.clear_cache()
+        start = time.perf_counter()
+        response = post_callback(client, body, headers)
+        cold = time.perf_counter() - start
+        warm = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = post_callback(client, body, headers)
+            warm.append(time.perf_counter() - start)
+        results[accept_encoding] = {"content_encoding": response.headers.get("Content-Encoding", "identity"),
+                                    "bytes": len(response.get_data()), "cold_seconds": cold,
+                                    "warm_seconds": statistics.median(warm)}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the update_stage_one response on the full selection")
+    parser.add_argument("--scale", type=int, default=1, help="replicate every dataset this many times")
+    parser.add_argument("--repeat", type=int, default=20, help="warm requests to take the median of")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.repeat)))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from suite import synthetic_data
+        synthetic_data(pathlib.Path(tmp), args.scale)
+        env = dict(os.environ, SYRUP_DATA_PATH=tmp, SYRUP_WATCH_INTERVAL="0", SYRUP_FIGURE_CACHE_DIR="")
+        output = subprocess.check_output([sys.executable, __file__, "--child", "--repeat", str(args.repeat)],
+                                         env=env, cwd=str(ROOT))
+    print("update_stage_one, every solver and encoding, data scaled " + str(args.scale) + "x")
+    for accept_encoding, r in json.loads(output).items():
+        print("  Accept-Encoding {:<9} -> {:<9} {:10.1f} KiB  cold {:8.4f}s  warm {:8.4f}s".format(
+            accept_encoding, r["content_encoding"], r["bytes"] / 1024, r["cold_seconds"], r["warm_seconds"]))
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# Compares load time and resident memory of the CSV files against the columnar store written by
+# convert_data.py, on the current data/ folder and on a synthetic copy with every file scaled 100x.
+#
+#   python3 benchmarks/data_store.py [--scale 100] [--json results.json]
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def rss_kib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def load_all():
+    # Runs in a fresh interpreter, configured through the SYRUP_* environment variables
+    import numpy as np
+    from convert_data import datasets_to_convert
+    from datasets import read_dataset
+    from settings import DATA_PATH
+    names = [path.stem for path in datasets_to_convert(DATA_PATH)]
+    rss_before = rss_kib()
+    start = time.perf_counter()
+    frames = [read_dataset(name) for name in names]
+    loaded = time.perf_counter()
+    # Touch every numeric column once, as the plots do, so lazily mapped pages are accounted for
+    for df in frames:
+        for column in df.select_dtypes(include=[np.number]).columns:
+            df[column].to_numpy().sum()
+    scanned = time.perf_counter()
+    return {"datasets": len(names), "load_seconds": loaded - start, "load_and_scan_seconds": scanned - start,
+            "rss_delta_kib": rss_kib() - rss_before}
+
+
+def run_child(data_path, columnar):
+    env = dict(os.environ, SYRUP_DATA_PATH=str(data_path), SYRUP_USE_COLUMNAR_STORE="1" if columnar else "0")
+    output = subprocess.check_output([sys.executable, __file__, "--child"], env=env, cwd=str(ROOT))
+    return json.loads(output)
+
+
+def scaled_copy(data_path, target, scale):
+    import pandas as pd
+    from convert_data import datasets_to_convert
+    for csv_path in datasets_to_convert(data_path):
+        df = pd.read_csv(csv_path, index_col=0)
+        pd.concat([df] * scale, ignore_index=True).to_csv(target.joinpath(csv_path.name))
+
+
+def compare(data_path):
+    from convert_data import convert
+    convert(data_path, data_path.joinpath("columnar"))
+    return {"csv": run_child(data_path, False), "columnar": run_child(data_path, True)}
+
+
+def report(label, results):
+    print(label)
+    for source in ("csv", "columnar"):
+        r = results[source]
+        print("  {:<9} load {:8.3f}s  load+scan {:8.3f}s  rss +{:8.1f} MiB".format(
+            source, r["load_seconds"], r["load_and_scan_seconds"], r["rss_delta_kib"] / 1024))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CSV and columnar data stores")
+    parser.add_argument("--scale", type=int, default=100, help="row multiplier of the synthetic copy")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(load_all()))
+        sys.exit(0)
+
+    from settings import DATA_PATH
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # The current dataset is copied as well, so the benchmark never writes into data/
+        current = pathlib.Path(tmp).joinpath("current")
+        scaled = pathlib.Path(tmp).joinpath("scaled")
+        current.mkdir()
+        scaled.mkdir()
+        scaled_copy(DATA_PATH, current, 1)
+        scaled_copy(DATA_PATH, scaled, args.scale)
+        results["current"] = compare(current)
+        results[str(args.scale) + "x"] = compare(scaled)
+    for label, result in results.items():
+        report(label, result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
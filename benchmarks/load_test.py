@@ -0,0 +1,352 @@
+#!/usr/bin/python3
+# Load test of the callback endpoint. Starts the app with N worker processes on synthetic copies of data/ as
+# in suite.py (gunicorn with gunicorn.conf.py when it is installed, otherwise forked werkzeug servers sharing
+# one socket), or targets a running server with --url. Every virtual user loads the page, fires the server
+# callbacks the browser fires on load and then replays SCENARIO, sending the requests the browser would:
+# the outputs of a response update the state of the user, and every change fires the server callbacks
+# taking it as input. Clientside callbacks send nothing.
+#
+#   python3 benchmarks/load_test.py [--users 8] [--workers 2] [--threads 1] [--duration 30] [--scale 1]
+#   python3 benchmarks/load_test.py --url http://127.0.0.1:8050 [--server-pid PID]
+import argparse
+import gzip
+import http.client
+import json
+import os
+import pathlib
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Changes replayed by every user after loading the page, as (component id, property, value). A value of
+# None picks a random option of the component.
+SCENARIO = [
+    ("section", "value", "final-comparison"),
+    ("section", "value", "stage-two"),
+    ("view-stage-two", "value", "sweep"),
+    ("section", "value", "stage-three"),
+    ("solver-stage-three", "value", None),
+    ("solver-stage-three", "value", None),
+    ("section", "value", "parameters"),
+    ("category_1", "value", None),
+    ("comparison", "value", None),
+    ("section", "value", "configurations"),
+    ("configuration-selection", "value", None),
+    ("section", "value", "drill-down"),
+    ("contract-table", "page_current", 1),
+    ("solver-drill-down", "value", None),
+    ("section", "value", "encodings"),
+]
+
+
+def request(url, method, path, body=None):
+    # (status, seconds, bytes on the wire, decoded body) of one request on a new connection, as gunicorn's
+    # sync workers close them anyway. Requests that get no response have the status 599.
+    parts = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=120)
+    headers = {"Accept-Encoding": "gzip"}
+    if body is not None:
+        body = json.dumps(body)
+        headers["Content-Type"] = "application/json"
+    start = time.perf_counter()
+    try:
+        connection.request(method, parts.path.rstrip("/") + path, body=body, headers=headers)
+        response = connection.getresponse()
+        content = response.read()
+    except (OSError, http.client.HTTPException):
+        # Refused or dropped connections count as errors
+        return 599, time.perf_counter() - start, 0, b""
+    finally:
+        connection.close()
+    seconds = time.perf_counter() - start
+    if response.getheader("Content-Encoding") == "gzip":
+        content_bytes = len(content)
+        content = gzip.decompress(content)
+    else:
+        content_bytes = len(content)
+    return response.status, seconds, content_bytes, content
+
+
+def layout_props(node, props=None):
+    # Properties of every component of the layout with an id, keyed by (id, property)
+    props = {} if props is None else props
+    if isinstance(node, list):
+        for child in node:
+            layout_props(child, props)
+    elif isinstance(node, dict) and "props" in node:
+        component_id = node["props"].get("id")
+        for name, value in node["props"].items():
+            if component_id is not None:
+                props[(component_id, name)] = value
+            layout_props(value, props)
+    return props
+
+
+def parse_outputs(output):
+    # [(id, property)] of the output string of a callback, "..a.b...c.d.." when it has several
+    if output.startswith(".."):
+        return [tuple(part.rsplit(".", 1)) for part in output[2:-2].split("...")]
+    return [tuple(output.rsplit(".", 1))]
+
+
+def server_callbacks(dependencies):
+    return [dependency for dependency in dependencies if not dependency.get("clientside_function")]
+
+
+def callback_body(dependency, state, changed):
+    outputs = [{"id": component_id, "property": prop} for component_id, prop in parse_outputs(dependency["output"])]
+    values = lambda items: [{"id": item["id"], "property": item["property"],
+                             "value": state.get((item["id"], item["property"]))} for item in items]
+    return {"output": dependency["output"], "outputs": outputs if dependency["output"].startswith("..") else outputs[0],
+            "inputs": values(dependency["inputs"]), "state": values(dependency["state"]),
+            "changedPropIds": [component_id + "." + prop for component_id, prop in changed]}
+
+
+def call(url, dependency, body):
+    # (status, seconds, bytes, decoded body) of a server callback. Background callbacks answer with a job, which
+    # is polled every interval of the callback until a response has the outputs, and they count as one request
+    # taking the time until then.
+    status, seconds, size, content = request(url, "POST", "/_dash-update-component", body)
+    job = json.loads(content) if status == 200 and dependency.get("long") else {}
+    if "cacheKey" not in job:
+        return status, seconds, size, content
+    start = time.perf_counter() - seconds
+    path = "/_dash-update-component?cacheKey={}&job={}".format(job["cacheKey"], job["job"])
+    while status == 200 and "response" not in json.loads(content):
+        time.sleep(dependency["long"]["interval"] / 1000)
+        status, _, poll_size, content = request(url, "POST", path, body)
+        size += poll_size
+    return status, time.perf_counter() - start, size, content
+
+
+def fire(url, dependencies, state, changed, record):
+    # Fires the server callbacks with an input among the changed properties, then those with an input among
+    # the properties their responses changed, as the browser does
+    pending = list(changed)
+    while pending:
+        changed = set(pending)
+        pending = []
+        for dependency in server_callbacks(dependencies):
+            inputs = {(item["id"], item["property"]) for item in dependency["inputs"]}
+            if not inputs & changed or any((component_id, "id") not in state for component_id, _ in inputs):
+                continue
+            status, seconds, size, content = call(url, dependency, callback_body(dependency, state, inputs & changed))
+            record(parse_outputs(dependency["output"])[0][0], status, seconds, size)
+            if status == 200:
+                for component_id, values in json.loads(content)["response"].items():
+                    for prop, value in values.items():
+                        state[(component_id, prop)] = value
+                        pending.append((component_id, prop))
+
+
+def pick(state, component_id, rng):
+    options = state.get((component_id, "options")) or []
+    values = [option["value"] if isinstance(option, dict) else option for option in options]
+    others = [value for value in values if value != state.get((component_id, "value"))]
+    return rng.choice(others or values) if values else None
+
+
+def user(url, deadline, think, seed, record):
+    # Loads the page and replays SCENARIO until the deadline
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        responses = {}
+        for path in ["/", "/_dash-layout", "/_dash-dependencies"]:
+            status, seconds, size, content = request(url, "GET", path)
+            record("GET " + path, status, seconds, size)
+            responses[path] = content
+        if any(not content for content in responses.values()):
+            continue
+        state = layout_props(json.loads(responses["/_dash-layout"]))
+        dependencies = json.loads(responses["/_dash-dependencies"])
+        # On load the browser fires every callback whose inputs are all in the layout
+        fire(url, dependencies, state, [(item["id"], item["property"]) for dependency in dependencies
+                                        for item in dependency["inputs"]], record)
+        for component_id, prop, value in SCENARIO:
+            if time.perf_counter() >= deadline:
+                break
+            time.sleep(think)
+            state[(component_id, prop)] = pick(state, component_id, rng) if value is None else value
+            fire(url, dependencies, state, [(component_id, prop)], record)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float("nan")
+
+
+def summary(records, seconds):
+    rows = {}
+    for label in sorted({r[0] for r in records}) + ["all"]:
+        selected = [r for r in records if label in ("all", r[0])]
+        latencies = [r[2] for r in selected]
+        # Updates are the responses with new outputs, the others are errors or 204 (PreventUpdate)
+        rows[label] = {"requests": len(selected), "errors": sum(1 for r in selected if r[1] >= 400),
+                       "updates": sum(1 for r in selected if r[1] == 200),
+                       "requests_per_second": len(selected) / seconds,
+                       "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                       "p99": percentile(latencies, 99), "bytes": sum(r[3] for r in selected) / max(len(selected), 1)}
+    return rows
+
+
+def memory_kib(pid):
+    from worker_rss import memory_kib
+    try:
+        return memory_kib(pid)
+    except (FileNotFoundError, ProcessLookupError, KeyError):
+        return None
+
+
+def children(pid):
+    # Processes whose parent is pid: the workers of a gunicorn master or of serve()
+    found = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open("/proc/" + entry + "/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        found.append(int(entry))
+            except (FileNotFoundError, ProcessLookupError):
+                pass
+    return found
+
+
+def serve(port, workers, threads):
+    # Runs in a fresh interpreter: loads the app like gunicorn.conf.py (preloading the data unless
+    # SYRUP_PRELOAD_DATA=0), then forks workers serving a shared socket. Threads above 1 make the werkzeug
+    # servers threaded, with a thread per connection.
+    import logging
+    from werkzeug.serving import make_server
+    os.environ.setdefault("SYRUP_PRELOAD_DATA", "1")
+    import app
+    from workers import prepare_fork
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", port))
+    listener.listen(128)
+    # As gunicorn.conf.py does before forking every worker
+    prepare_fork()
+    for _ in range(workers):
+        if os.fork() == 0:
+            make_server("127.0.0.1", port, app.server, threaded=threads > 1, fd=listener.fileno()).serve_forever()
+            os._exit(0)
+    for _ in range(workers):
+        os.wait()
+
+
+def server_command(port, workers, threads):
+    # (server, command starting it): gunicorn when it is installed, serve otherwise
+    try:
+        import gunicorn
+        return "gunicorn", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+                            "--threads", str(threads), "--bind", "127.0.0.1:" + str(port), "app:server"]
+    except ImportError:
+        return "werkzeug", [sys.executable, __file__, "--serve", str(port), str(workers), str(threads)]
+
+
+def start_server(port, workers, threads, env):
+    server, command = server_command(port, workers, threads)
+    process = subprocess.Popen(command, env=env, cwd=str(ROOT))
+    url = "http://127.0.0.1:" + str(port)
+    for _ in range(600):
+        if request(url, "GET", "/_dash-dependencies")[0] == 200:
+            return process, url, server
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("the server did not start")
+
+
+def stop_server(process):
+    # The workers first, as the werkzeug ones would outlive their master
+    for pid in children(process.pid):
+        os.kill(pid, 9)
+    process.kill()
+    process.wait()
+
+
+def run(url, users, duration, think):
+    records = []
+    lock = threading.Lock()
+
+    def record(*entry):
+        with lock:
+            records.append(entry)
+
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=user, args=(url, deadline, think, seed, record)) for seed in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summary(records, time.perf_counter() - start)
+
+
+def print_results(results):
+    setup = results["setup"]
+    print("{} users for {:.0f} s against {}".format(setup["users"], setup["seconds"], setup.get("url") or (
+        "{} {} workers with {} threads".format(setup["workers"], setup["server"], setup["threads"]))))
+    for label, r in results["requests"].items():
+        print("  {:<26} {:6d} req {:7.1f} req/s  updates {:6.1%}  errors {:5.1%}  p50 {:7.1f} ms  p95 {:7.1f} ms"
+              "  p99 {:7.1f} ms  {:8.1f} KiB".format(label, r["requests"], r["requests_per_second"],
+                                                   r["updates"] / max(r["requests"], 1),
+                                                   r["errors"] / max(r["requests"], 1), r["p50"] * 1000,
+                                                   r["p95"] * 1000, r["p99"] * 1000, r["bytes"] / 1024))
+    for pid, memory in results["workers"].items():
+        if memory is not None:
+            print("  worker {:<8} rss {:7.1f} MiB  pss {:7.1f} MiB  private {:7.1f} MiB".format(
+                pid, memory["rss"] / 1024, memory["pss"] / 1024, memory["uss"] / 1024))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay browser sessions against the Dash callback endpoint")
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes of the server started")
+    parser.add_argument("--threads", type=int, default=1, help="threads per worker of the server started")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run the users for")
+    parser.add_argument("--think", type=float, default=0, help="seconds a user waits between two changes")
+    parser.add_argument("--scale", type=int, default=1, help="replicate every dataset this many times")
+    parser.add_argument("--url", default=None, help="test a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="master process of the server at --url")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--serve", type=int, nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(*args.serve)
+        sys.exit(0)
+
+    setup = {"users": args.users, "seconds": args.duration, "scale": args.scale}
+    if args.url:
+        setup = {"users": args.users, "seconds": args.duration, "url": args.url}
+        requests = run(args.url, args.users, args.duration, args.think)
+        workers = {pid: memory_kib(pid) for pid in (children(args.server_pid) if args.server_pid else [])}
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            from suite import synthetic_data
+            synthetic_data(pathlib.Path(tmp), args.scale)
+            env = dict(os.environ, SYRUP_DATA_PATH=tmp, SYRUP_WATCH_INTERVAL="0", SYRUP_FIGURE_CACHE_DIR="",
+                       SYRUP_JOB_DIR=os.path.join(tmp, "jobs"))
+            with socket.socket() as probe:
+                probe.bind(("127.0.0.1", 0))
+                port = probe.getsockname()[1]
+            process, url, server = start_server(port, args.workers, args.threads, env)
+            setup.update(workers=args.workers, threads=args.threads, server=server)
+            try:
+                requests = run(url, args.users, args.duration, args.think)
+                workers = {pid: memory_kib(pid) for pid in children(process.pid)}
+            finally:
+                stop_server(process)
+    results = {"setup": setup, "requests": requests, "workers": workers}
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
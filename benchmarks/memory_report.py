@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# Memory taken by every dataset of data/ when read as plain pd.read_csv frames, with the compact loader of
+# datasets.py (every column but the lazy ones), and with the columns the dashboard actually reads after
+# computing every section. Strings shared between frames (the interned key columns) are counted once.
+#
+#   python3 benchmarks/memory_report.py [--scale 10]
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def frames_bytes(frames):
+    # Object columns are counted as their pointers plus every distinct string object once
+    total = 0
+    strings = {}
+    for df in frames:
+        total += int(df.memory_usage(index=True, deep=False).sum())
+        for column in df.columns:
+            if df[column].dtype == object:
+                for value in df[column].to_numpy():
+                    strings[id(value)] = sys.getsizeof(value)
+    return total + sum(strings.values())
+
+
+def measure():
+    # Runs in a fresh interpreter whose SYRUP_DATA_PATH points to the data to measure
+    import pandas as pd
+    import app
+    import datasets
+    from suite import options
+    names = datasets.available_datasets()
+    plain = frames_bytes([pd.read_csv(datasets.dataset_path(name)) for name in names])
+    compact = frames_bytes([datasets.read_dataset(name) for name in names])
+    datasets.clear_cache()
+    app.update_stage_one('encodings', options(app.solver_order), options(app.encoding_order), None)
+    app.update_stage_one_final_comparison('final-comparison', options(app.solver_order),
+                                          options(app.final_encoding_order), None)
+    app.update_stage_two('stage-two', 'boxes', options(app.solver_order), options(['1s', '10s', '15s', '30s', '60s']),
+                         None)
+    for solver in app.solver_order:
+        app.update_stage_three('stage-three', solver, None)
+    for parameter in ['init', 'size_relation', 'number_push', 'uninterpreted_per_initial']:
+        app.update_configuration_study('configurations', parameter, None)
+    for category in app.compared_encodings():
+        app.update_comparison('parameters', 'no_output_before_pop', category, 'init_progr_len', None)
+    # Frames indexed by a column, keyed by (name, column), are copies of the columns of their dataset
+    used = frames_bytes([entry[2] for key, entry in datasets._cache.items() if isinstance(key, str)])
+    return {"datasets": len(names), "plain_bytes": plain, "compact_bytes": compact, "used_bytes": used}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the memory taken by the datasets of data/")
+    parser.add_argument("--scale", type=int, default=1, help="replicate every dataset this many times")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure()))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from suite import synthetic_data
+        synthetic_data(pathlib.Path(tmp), args.scale)
+        env = dict(os.environ, SYRUP_DATA_PATH=tmp, SYRUP_WATCH_INTERVAL="0", SYRUP_FIGURE_CACHE_DIR="")
+        r = json.loads(subprocess.check_output([sys.executable, __file__, "--child"], env=env, cwd=str(ROOT)))
+    print("{} datasets, data scaled {}x".format(r["datasets"], args.scale))
+    print("  pd.read_csv            {:10.2f} MiB".format(r["plain_bytes"] / 2 ** 20))
+    print("  compact, every column  {:10.2f} MiB  ({:.1f}x smaller)".format(
+        r["compact_bytes"] / 2 ** 20, r["plain_bytes"] / r["compact_bytes"]))
+    print("  compact, columns used  {:10.2f} MiB  ({:.1f}x smaller)".format(
+        r["used_bytes"] / 2 ** 20, r["plain_bytes"] / r["used_bytes"]))
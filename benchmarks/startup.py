@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# Startup cost of the dashboard on synthetic copies of data/: the modules taking the longest to import, as
+# reported by python -X importtime, and the time from starting a server with one worker until it answers its
+# first page load, with the figures of the callbacks the browser fires on load. Exits with status 1 when the
+# first page takes longer than --target seconds, so it can guard cold starts in CI.
+#
+#   python3 benchmarks/startup.py [--scale 10] [--top 15] [--target 5] [--json results.json]
+import argparse
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def import_profile(env, top=15):
+    # Seconds taken by import app in a fresh interpreter (module bodies included, e.g. the layout Dash builds
+    # when app.layout is set) and the top modules by cumulative import time, as (module, depth, seconds)
+    # with depth the nesting shown by -X importtime
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], env=env, cwd=str(ROOT),
+                             stderr=subprocess.PIPE, text=True, check=True)
+    seconds = time.perf_counter() - start
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), (len(name) - len(name.lstrip()) - 1) // 2, int(cumulative) / 1e6))
+    app_seconds = next((seconds for name, _, seconds in modules if name == "app"), None)
+    slowest = sorted((module for module in modules if module[0] != "app"), key=lambda module: -module[2])[:top]
+    return {"process_seconds": seconds, "import_seconds": app_seconds, "modules": slowest}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_response(env):
+    # Seconds from starting the server until /_dash-layout answers, and until the callbacks fired on load
+    # have answered too
+    from load_test import fire, layout_props, request, server_command, stop_server
+    port = free_port()
+    url = "http://127.0.0.1:" + str(port)
+    server, command = server_command(port, 1, 1)
+    start = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=str(ROOT))
+    try:
+        status, _, _, layout = request(url, "GET", "/_dash-layout")
+        while status != 200:
+            if process.poll() is not None or time.perf_counter() - start > 120:
+                raise RuntimeError("the server did not start")
+            time.sleep(0.01)
+            status, _, _, layout = request(url, "GET", "/_dash-layout")
+        ready = time.perf_counter() - start
+        dependencies = json.loads(request(url, "GET", "/_dash-dependencies")[3])
+        errors = []
+        fire(url, dependencies, layout_props(json.loads(layout)),
+             [(item["id"], item["property"]) for dependency in dependencies for item in dependency["inputs"]],
+             lambda label, status, seconds, size: status >= 400 and errors.append(label))
+        first_page = time.perf_counter() - start
+    finally:
+        stop_server(process)
+    return {"server": server, "ready_seconds": ready, "first_page_seconds": first_page, "errors": errors}
+
+
+def print_results(results):
+    profile = results["imports"]
+    print("import app {:.3f} s ({:.3f} s with the interpreter), slowest modules:".format(
+        profile["import_seconds"], profile["process_seconds"]))
+    for name, depth, seconds in profile["modules"]:
+        print("  {:8.3f} s  {}{}".format(seconds, "  " * depth, name))
+    response = results["first_response"]
+    print("{} worker: layout served after {:.3f} s, first page with its figures after {:.3f} s (target {:.1f} s)"
+          .format(response["server"], response["ready_seconds"], response["first_page_seconds"], results["target"]))
+    if response["errors"]:
+        print("  failed callbacks: " + ", ".join(response["errors"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the imports and the first response of the dashboard")
+    parser.add_argument("--scale", type=int, default=1, help="replicate every dataset this many times")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the import profile")
+    parser.add_argument("--target", type=float, default=5.0, help="seconds allowed until the first page is shown")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from suite import synthetic_data
+        synthetic_data(pathlib.Path(tmp), args.scale)
+        env = dict(os.environ, SYRUP_DATA_PATH=tmp, SYRUP_WATCH_INTERVAL="0", SYRUP_FIGURE_CACHE_DIR="",
+                   SYRUP_JOB_DIR=os.path.join(tmp, "jobs"))
+        results = {"scale": args.scale, "target": args.target, "imports": import_profile(env, args.top),
+                   "first_response": first_response(env)}
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    response = results["first_response"]
+    sys.exit(1 if response["errors"] or response["first_page_seconds"] > args.target else 0)
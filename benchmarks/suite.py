@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+# Times every plot function of plots.py and every callback of app.py on synthetic copies of data/ with the
+# row count of each dataset multiplied by 1, 10, 100 (and 1000 on request). Each case is run cold (every
+# cache emptied) and warm, and its peak traced memory and figure JSON size are recorded. Results are written
+# as JSON with the import profile of app.py (see startup.py), so two commits can be compared with --compare.
+#
+#   python3 benchmarks/suite.py [--scales 1 10 100 1000] [--columnar] [--output results.json]
+#   python3 benchmarks/suite.py --compare before.json after.json
+import argparse
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from startup import import_profile
+
+SOLVERS = ['combined', 'barcelogic', 'z3', 'oms']
+TIMEOUTS = ['1s', '10s', '15s', '30s', '60s']
+
+
+def options(values):
+    # Checklist options as the server side callbacks of the filtered sections receive them
+    return [{'label': value, 'value': value} for value in values]
+
+
+def synthetic_data(target, scale):
+    # Every dataset is replicated scale times. Contract names and block ids get the replica number as
+    # suffix, so they stay unique and CAV/final_setup files still match each other by name.
+    import pandas as pd
+    from catalog import records
+    from datasets import dataset_path
+    for name, record in records().items():
+        df = pd.read_csv(dataset_path(name), index_col=0)
+        if record["kind"] in ("results", "comparison", "blocks") and scale > 1:
+            key = 'block_id' if 'block_id' in df.columns else 'name'
+            replicas = []
+            for replica in range(scale):
+                copy = df.copy()
+                copy[key] = copy[key].astype(str) + "_" + str(replica)
+                replicas.append(copy)
+            df = pd.concat(replicas, ignore_index=True)
+        df.to_csv(target.joinpath(name + ".csv"))
+
+
+def cases(app, plots):
+    return {
+        "plot_time": lambda: plots.plot_time(SOLVERS, app.encoding_order),
+        "plot_gas": lambda: plots.plot_gas(SOLVERS, app.encoding_order),
+        "plot_statistics": lambda: plots.plot_statistics(SOLVERS, app.encoding_order),
+        "plot_comparison": lambda: plots.plot_comparison("no_output_before_pop",
+                                                         "no_output_before_pop_at_most_pushed_once",
+                                                         "push_per_expected"),
+        "plot_configuration_comparison": lambda: plots.plot_configuration_comparison("init"),
+        "plot_statistics_pie_chart": lambda: plots.plot_statistics_pie_chart("combined"),
+        "plot_bar_comparison": lambda: plots.plot_bar_comparison("combined", "time"),
+        "update_stage_one": lambda: app.update_stage_one("encodings", options(SOLVERS),
+                                                             options(app.encoding_order), None),
+        "update_stage_one_final_comparison": lambda: app.update_stage_one_final_comparison(
+            "final-comparison", options(SOLVERS), options(app.final_encoding_order), None),
+        "plot_timeout_sweep": lambda: plots.plot_timeout_sweep(SOLVERS, TIMEOUTS),
+        "plot_time_ecdf": lambda: plots.plot_time_ecdf(SOLVERS, TIMEOUTS),
+        "update_stage_two": lambda: app.update_stage_two("stage-two", "boxes", options(SOLVERS), options(TIMEOUTS),
+                                                         None),
+        "update_stage_two_sweep": lambda: app.update_stage_two("stage-two", "sweep", options(SOLVERS),
+                                                               options(TIMEOUTS), None),
+        "update_stage_three": lambda: app.update_stage_three("stage-three", "combined", None),
+        "update_comparison": lambda: app.update_comparison("parameters", "no_output_before_pop",
+                                                           "no_output_before_pop_at_most_pushed_once",
+                                                           "push_per_expected", None),
+        "update_configuration_study": lambda: app.update_configuration_study("configurations", "init", None),
+    }
+
+
+def clear_caches():
+    import aggregates
+    import datasets
+    import figure_cache
+    import pairwise
+    aggregates.clear_cache()
+    datasets.clear_cache()
+    figure_cache.clear_cache()
+    pairwise.clear_cache()
+
+
+def figure_bytes(result):
+    import plotly.io as pio
+    # Callbacks also return the inputs their section was rendered for after the figures
+    figures = result[:-1] if isinstance(result, tuple) else [result]
+    return sum(len(pio.to_json(figure, validate=False)) for figure in figures)
+
+
+def run_cases():
+    # Runs in a fresh interpreter whose SYRUP_DATA_PATH points to the synthetic data
+    import app
+    import plots
+    results = {}
+    for name, case in cases(app, plots).items():
+        clear_caches()
+        tracemalloc.start()
+        case()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        clear_caches()
+        start = time.perf_counter()
+        case()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        result = case()
+        warm = time.perf_counter() - start
+        results[name] = {"cold_seconds": cold, "warm_seconds": warm, "peak_bytes": peak,
+                         "figure_bytes": figure_bytes(result)}
+    return results
+
+
+def run_scale(scale, columnar):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = pathlib.Path(tmp)
+        synthetic_data(data_path, scale)
+        if columnar:
+            from convert_data import convert
+            convert(data_path, data_path.joinpath("columnar"))
+        env = dict(os.environ, SYRUP_DATA_PATH=str(data_path), SYRUP_WATCH_INTERVAL="0",
+                   SYRUP_USE_COLUMNAR_STORE="1" if columnar else "0", SYRUP_FIGURE_CACHE_DIR="")
+        output = subprocess.check_output([sys.executable, __file__, "--child"], env=env, cwd=str(ROOT))
+        imports = import_profile(env, 5)
+    return json.loads(output), imports
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=str(ROOT), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    for scale, scale_results in results["scales"].items():
+        print("scale " + scale + "x")
+        profile = results["imports"][scale]
+        print("  import app {:.3f}s, slowest: {}".format(profile["import_seconds"], ", ".join(
+            "{} {:.3f}s".format(name, seconds) for name, _, seconds in profile["modules"])))
+        for name, r in scale_results.items():
+            print("  {:<36} cold {:8.4f}s  warm {:8.4f}s  peak {:8.1f} MiB  figures {:8.1f} KiB".format(
+                name, r["cold_seconds"], r["warm_seconds"], r["peak_bytes"] / 2 ** 20, r["figure_bytes"] / 1024))
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    for scale, scale_results in after["scales"].items():
+        print("scale " + scale + "x")
+        if scale in before.get("imports", {}) and scale in after.get("imports", {}):
+            print("  {:<36} {:6.2f}x".format("import app", after["imports"][scale]["import_seconds"] /
+                                             before["imports"][scale]["import_seconds"]))
+        for name, r in scale_results.items():
+            old = before["scales"].get(scale, {}).get(name)
+            if old is None:
+                continue
+            print("  {:<36} cold {:6.2f}x  warm {:6.2f}x  peak {:6.2f}x  figures {:6.2f}x".format(
+                name, *[r[key] / old[key] if old[key] else float("nan")
+                        for key in ("cold_seconds", "warm_seconds", "peak_bytes", "figure_bytes")]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the plot functions and callbacks on scaled data")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--columnar", action="store_true", help="read the synthetic data from the columnar store")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_cases()))
+        sys.exit(0)
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    runs = {str(scale): run_scale(scale, args.columnar) for scale in args.scales}
+    results = {"commit": git_commit(), "python": platform.python_version(), "columnar": args.columnar,
+               "scales": {scale: run[0] for scale, run in runs.items()},
+               "imports": {scale: run[1] for scale, run in runs.items()}}
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
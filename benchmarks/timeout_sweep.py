@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# Time taken by stage two on a sweep of many timeouts: the boxes of every run (plot_time and plot_gas)
+# against the curves of the sweep (plot_timeout_sweep and plot_time_ecdf), and a single plot_time of the
+# five timeouts of the study for reference. The runs of the sweep are copies of the 10s results of data/
+# with their times and saved gas scaled, so that every run differs from the others.
+#
+#   python3 benchmarks/timeout_sweep.py [--timeouts 50] [--scale 10]
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SOLVERS = ['combined', 'barcelogic', 'z3', 'oms']
+
+
+def sweep_data(target, timeouts):
+    # Adds <seconds>s_<solver> runs from 1 s to 120 s built from the 10s results in target
+    import numpy as np
+    import pandas as pd
+    names = []
+    for seconds in np.geomspace(1, 120, timeouts).round(1):
+        timeout = ("%g" % seconds) + "s"
+        if timeout in names:
+            continue
+        names.append(timeout)
+        for solver in SOLVERS:
+            path = target.joinpath(timeout + "_" + solver + ".csv")
+            if path.exists():
+                continue
+            df = pd.read_csv(target.joinpath("10s_" + solver + ".csv"), index_col=0)
+            df['time'] = df['time'] * seconds / 10
+            df['saved_gas'] = df['saved_gas'] * min(1.0, 0.8 + np.log10(seconds) / 10)
+            df.to_csv(path)
+    return names
+
+
+def measure(timeouts):
+    # Runs in a fresh interpreter whose SYRUP_DATA_PATH points to the data with the sweep
+    import app
+    import plots
+    from suite import clear_caches
+    results = {}
+    for name, functions, selected in [("plot_time, 5 timeouts", [plots.plot_time], TIMEOUTS),
+                                      ("boxes of the sweep", [plots.plot_time, plots.plot_gas], timeouts),
+                                      ("curves of the sweep", [plots.plot_timeout_sweep, plots.plot_time_ecdf],
+                                       timeouts)]:
+        clear_caches()
+        start = time.perf_counter()
+        figures = [function(SOLVERS, selected) for function in functions]
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        figures = [function(SOLVERS, selected) for function in functions]
+        warm = time.perf_counter() - start
+        results[name] = {"cold_seconds": cold, "warm_seconds": warm,
+                         "figure_bytes": sum(len(figure.to_json()) for figure in figures)}
+    return results
+
+
+TIMEOUTS = ['1s', '10s', '15s', '30s', '60s']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time stage two on a sweep of many timeouts")
+    parser.add_argument("--timeouts", type=int, default=50, help="number of timeouts of the sweep")
+    parser.add_argument("--scale", type=int, default=1, help="replicate every dataset this many times")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.child)))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from suite import synthetic_data
+        synthetic_data(pathlib.Path(tmp), args.scale)
+        timeouts = sweep_data(pathlib.Path(tmp), args.timeouts)
+        env = dict(os.environ, SYRUP_DATA_PATH=tmp, SYRUP_WATCH_INTERVAL="0", SYRUP_FIGURE_CACHE_DIR="")
+        output = subprocess.check_output([sys.executable, __file__, "--child"] + timeouts, env=env, cwd=str(ROOT))
+    print("{} timeouts, {} solvers, data scaled {}x".format(len(timeouts), len(SOLVERS), args.scale))
+    for name, r in json.loads(output).items():
+        print("  {:<24} cold {:8.4f}s  warm {:8.4f}s  figures {:10.1f} KiB".format(
+            name, r["cold_seconds"], r["warm_seconds"], r["figure_bytes"] / 1024))
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# Measures the memory of N forked workers serving the stage callbacks, with and without loading the data
+# in the parent before forking (what gunicorn.conf.py does with preload_app). Pss counts shared pages
+# divided by the number of processes sharing them, so its sum is the real footprint of the workers.
+#
+#   python3 benchmarks/worker_rss.py [--workers 4]
+import argparse
+import json
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SOLVERS = ['combined', 'barcelogic', 'z3', 'oms']
+
+
+def memory_kib(pid="self"):
+    memory = {}
+    with open("/proc/" + str(pid) + "/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                memory[key] = int(value.split()[0])
+    return {"rss": memory["Rss"], "pss": memory["Pss"], "uss": memory["Private_Clean"] + memory["Private_Dirty"]}
+
+
+def serve_requests(app):
+    from suite import options
+    app.update_stage_one('encodings', options(SOLVERS), options(app.encoding_order), None)
+    app.update_stage_one_final_comparison('final-comparison', options(SOLVERS), options(app.final_encoding_order),
+                                          None)
+    app.update_stage_two('stage-two', 'boxes', options(SOLVERS), options(['1s', '10s', '15s', '30s', '60s']), None)
+    for solver in SOLVERS:
+        app.update_stage_three('stage-three', solver, None)
+
+
+def run_workers(workers):
+    # Runs in a fresh interpreter, SYRUP_PRELOAD_DATA decides whether app.py loads the data before forking
+    import app
+    from workers import prepare_fork
+    prepare_fork()
+    pids = []
+    read_end, write_end = os.pipe()
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            serve_requests(app)
+            os.write(write_end, b"x")
+            # Keep the worker alive until the parent has measured it
+            while True:
+                signal.pause()
+        pids.append(pid)
+    os.close(write_end)
+    for _ in range(workers):
+        os.read(read_end, 1)
+    result = {"parent": memory_kib(), "workers": [memory_kib(pid) for pid in pids]}
+    for pid in pids:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+    return result
+
+
+def measure(workers, preload):
+    env = dict(os.environ, SYRUP_PRELOAD_DATA="1" if preload else "0")
+    output = subprocess.check_output([sys.executable, __file__, "--child", str(workers)], env=env, cwd=str(ROOT))
+    return json.loads(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-worker memory with and without preloading")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        print(json.dumps(run_workers(args.child)))
+        sys.exit(0)
+
+    results = {mode: measure(args.workers, mode == "preload") for mode in ("lazy", "preload")}
+    for mode, result in results.items():
+        workers = result["workers"]
+        print("{:<8} parent rss {:7.1f} MiB | per worker: rss {:7.1f} MiB  pss {:7.1f} MiB  private {:7.1f} MiB"
+              " | total pss {:7.1f} MiB".format(
+                  mode, result["parent"]["rss"] / 1024,
+                  sum(w["rss"] for w in workers) / len(workers) / 1024,
+                  sum(w["pss"] for w in workers) / len(workers) / 1024,
+                  sum(w["uss"] for w in workers) / len(workers) / 1024,
+                  (result["parent"]["pss"] + sum(w["pss"] for w in workers)) / 1024))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,237 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+
+from datasets import available_datasets, dataset_path, dataset_version, columnar_path, loaded_rows, read_dataset, \
+    track_missing, SCHEMA_FILE
+
+# One record per dataset under data/, built from the file names and headers when the catalog is first used
+# and updated by watcher.py. Lookups never touch the disk, so selections without data are rejected for free.
+_records = {}
+_solvers_by_encoding = {}
+_encodings_by_solver = {}
+_comparisons = {}
+_block_encodings = set()
+_built = False
+# Number of times the records were built or updated
+_version = 0
+_lock = threading.Lock()
+
+# Encoding of the results of a timeout run, e.g. 10s_z3.csv or 2.5s_z3.csv
+TIMEOUT_PATTERN = re.compile(r"^\d+(\.\d+)?s$")
+
+
+def _kind(name):
+    if name.startswith("comparison_"):
+        return "comparison"
+    if name.startswith("blocks_"):
+        return "blocks"
+    if name.endswith("_parameter_comparison"):
+        return "parameter_comparison"
+    if "_" in name:
+        return "results"
+    return "other"
+
+
+def split_result_name(name):
+    # (encoding, solver) of a per-contract result file named <encoding>_<solver>, None for other files
+    if _kind(name) != "results":
+        return None
+    return tuple(name.rsplit("_", 1))
+
+
+def _split_comparison_name(name, encodings):
+    # comparison_<a>_<b>: both encodings may contain underscores, so the split is the one where both sides
+    # are known encodings
+    parts = name[len("comparison_"):].split("_")
+    for i in range(1, len(parts)):
+        first, second = "_".join(parts[:i]), "_".join(parts[i:])
+        if first in encodings and second in encodings:
+            return first, second
+    return None
+
+
+def _describe(name):
+    # Row count, columns and size of the dataset, from the columnar schema when there is one. A CSV is only
+    # described from its header, as counting its rows would read the whole file while starting up: its row
+    # count is None until the dataset is parsed (see _with_rows).
+    schema_path = columnar_path(name).joinpath(SCHEMA_FILE)
+    csv_path = dataset_path(name)
+    if dataset_version(name)[0] == "columnar":
+        with open(schema_path) as f:
+            schema = json.load(f)
+        size = sum(columnar_path(name).joinpath(column["file"]).stat().st_size for column in schema["columns"])
+        return {"rows": schema["rows"], "columns": {column["name"]: column["dtype"] for column in schema["columns"]},
+                "bytes": size}
+    with open(csv_path, newline="") as f:
+        header = next(csv.reader(f), [])
+        size = os.fstat(f.fileno()).st_size
+    return {"rows": None, "columns": {column: None for column in header}, "bytes": size}
+
+
+def _index():
+    # Rebuilds the lookup tables from the records, which is cheap as it only looks at names
+    _solvers_by_encoding.clear()
+    _encodings_by_solver.clear()
+    _comparisons.clear()
+    _block_encodings.clear()
+    for record in _records.values():
+        if record["kind"] == "blocks":
+            _block_encodings.add(record["encoding"])
+        if record["kind"] == "results":
+            _solvers_by_encoding.setdefault(record["encoding"], set()).add(record["solver"])
+            _encodings_by_solver.setdefault(record["solver"], set()).add(record["encoding"])
+    for name, record in _records.items():
+        if record["kind"] == "comparison":
+            record["pair"] = _split_comparison_name(name, _solvers_by_encoding.keys() | _block_encodings)
+            if record["pair"] is not None:
+                _comparisons[record["pair"]] = name
+
+
+def _record(name):
+    record = {"name": name, "kind": _kind(name), "encoding": None, "solver": None, "pair": None}
+    if record["kind"] == "results":
+        record["encoding"], record["solver"] = split_result_name(name)
+    elif record["kind"] == "blocks":
+        record["encoding"] = name[len("blocks_"):]
+    record.update(_describe(name))
+    return record
+
+
+def refresh(changed=None, removed=()):
+    # Describes the given datasets again (all of them when changed is None) and forgets the removed ones
+    global _built, _version
+    names = available_datasets() if changed is None else changed
+    records = {}
+    for name in names:
+        try:
+            records[name] = _record(name)
+        except FileNotFoundError:
+            pass  # Removed while scanning
+    with _lock:
+        if changed is None:
+            _records.clear()
+        _records.update(records)
+        for name in removed:
+            _records.pop(name, None)
+        _index()
+        _built = True
+        _version += 1
+
+
+def _ensure_built():
+    if not _built:
+        refresh()
+
+
+def catalog_version():
+    # Changes whenever the datasets listed by the catalog do
+    _ensure_built()
+    return _version
+
+
+def catalog_digest():
+    # Digest of the names of the datasets listed, which unlike catalog_version is the same in every process and
+    # across restarts for the same data/
+    _ensure_built()
+    with _lock:
+        return hashlib.sha1("\n".join(sorted(_records)).encode()).hexdigest()
+
+
+def _with_rows(record):
+    # Fills the row count of a CSV record once read_dataset parsed the dataset
+    if record is not None and record["rows"] is None:
+        record["rows"] = loaded_rows(record["name"])
+    return record
+
+
+def records():
+    _ensure_built()
+    with _lock:
+        return {name: _with_rows(record) for name, record in _records.items()}
+
+
+def record(name):
+    _ensure_built()
+    with _lock:
+        return _with_rows(_records.get(name))
+
+
+def row_count(name):
+    # Rows of the dataset, None if there is no such dataset. A CSV not parsed yet is read for it.
+    described = record(name)
+    if described is None or described["rows"] is not None:
+        return None if described is None else described["rows"]
+    return len(read_dataset(name))
+
+
+def has_dataset(name):
+    # A missing dataset is tracked as a dependency, see datasets.track_missing
+    _ensure_built()
+    if name in _records:
+        return True
+    track_missing(name)
+    return False
+
+
+def solvers_for(encoding):
+    _ensure_built()
+    return frozenset(_solvers_by_encoding.get(encoding, ()))
+
+
+def encodings_for(solver):
+    _ensure_built()
+    return frozenset(_encodings_by_solver.get(solver, ()))
+
+
+def has_results(encoding, solver):
+    if solver in solvers_for(encoding):
+        return True
+    track_missing(encoding + "_" + solver)
+    return False
+
+
+def result_datasets():
+    # (encoding, solver) of every per-contract result file
+    _ensure_built()
+    return sorted((record["encoding"], record["solver"]) for record in _records.values()
+                  if record["kind"] == "results")
+
+
+def timeout_seconds(encoding):
+    # Timeout of a run named like 10s or 2.5s, None for any other encoding
+    return float(encoding[:-1]) if TIMEOUT_PATTERN.match(encoding) else None
+
+
+def timeout_runs():
+    # Timeouts with results in data/, from the shortest to the longest
+    _ensure_built()
+    return sorted((encoding for encoding in _solvers_by_encoding if timeout_seconds(encoding) is not None),
+                  key=timeout_seconds)
+
+
+def comparison_name(first, second):
+    # Name of the comparison_<first>_<second> dataset, None if there is none
+    _ensure_built()
+    name = _comparisons.get((first, second))
+    if name is None:
+        track_missing("comparison_" + first + "_" + second)
+    return name
+
+
+def blocks_name(encoding):
+    # Name of the blocks_<encoding> dataset with the per-block results of encoding, None if there is none
+    _ensure_built()
+    if encoding in _block_encodings:
+        return "blocks_" + encoding
+    track_missing("blocks_" + encoding)
+    return None
+
+
+def compared_encodings():
+    # Encodings that can be compared with each other: those with per-block results or a comparison file
+    _ensure_built()
+    return sorted(_block_encodings.union(*[set(pair) for pair in _comparisons]))
@@ -0,0 +1,40 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import flask
+
+from settings import COMPRESS_MIN_BYTES
+
+GZIP_LEVEL = 6
+# Higher qualities compress a bit more but are several times slower than gzip
+BROTLI_QUALITY = 4
+
+
+def _encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response):
+    # after_request hook compressing the JSON responses the browser accepts compressed
+    if response.mimetype != "application/json" or response.direct_passthrough or \
+            response.status_code != 200 or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding(flask.request.accept_encodings)
+    if encoding is None or response.calculate_content_length() < COMPRESS_MIN_BYTES:
+        return response
+    data = response.get_data()
+    if encoding == "br":
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+# Converts the CSVs under data/ into the columnar store that datasets.read_dataset prefers over CSV.
+# Run it again after adding or replacing CSVs: a CSV that is not the one its columnar copy was converted
+# from (other mtime or size) is read as CSV.
+import argparse
+import os
+import pathlib
+import re
+
+import pandas as pd
+
+from datasets import compact, write_columnar
+from settings import DATA_PATH, COLUMNAR_PATH
+
+# <encoding>_<solver>.csv, comparison_<a>_<b>.csv and <parameter>_parameter_comparison.csv
+DATASET_PATTERNS = [re.compile(r"^comparison_.+_.+\.csv$"),
+                    re.compile(r"^.+_parameter_comparison\.csv$"),
+                    re.compile(r"^.+_[^_]+\.csv$")]
+
+
+def datasets_to_convert(data_path):
+    return sorted(path for path in data_path.glob("*.csv")
+                  if any(pattern.match(path.name) for pattern in DATASET_PATTERNS))
+
+
+def convert(data_path=DATA_PATH, columnar_path=COLUMNAR_PATH, verbose=False):
+    converted = []
+    for csv_path in datasets_to_convert(data_path):
+        source = os.stat(csv_path)
+        df = pd.read_csv(csv_path)
+        write_columnar(csv_path.stem, compact(df), columnar_path, source)
+        converted.append(csv_path.stem)
+        if verbose:
+            print("Converted", csv_path.name, "(" + str(len(df)) + " rows)")
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the CSV datasets into the columnar store")
+    parser.add_argument("--data", default=str(DATA_PATH), help="folder with the CSV files")
+    parser.add_argument("--output", default=None, help="output folder (defaults to <data>/columnar)")
+    args = parser.parse_args()
+    data_path = pathlib.Path(args.data).resolve()
+    columnar_path = pathlib.Path(args.output).resolve() if args.output else data_path.joinpath("columnar")
+    names = convert(data_path, columnar_path, verbose=True)
+    print("Converted", len(names), "datasets into", columnar_path)
@@ -0,0 +1,406 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+from settings import DATA_PATH, COLUMNAR_PATH, USE_COLUMNAR_STORE, DATASET_CACHE_MAX_ENTRIES, \
+    DATASET_CACHE_MAX_BYTES
+
+SCHEMA_FILE = "schema.json"
+# How some columns are kept in memory. "key" columns (the contract and block identifiers, repeated in many
+# datasets) share a single string object per distinct value across every dataset, and "lazy" columns (the
+# index written by to_csv, the disassembled blocks) are only loaded when a caller asks for them by name.
+# Every other numeric column whose values are all integers is stored in the smallest integer type that
+# holds them.
+COLUMN_TYPES = {'Unnamed: 0': 'lazy', 'name': 'key', 'block_id': 'key', 'target_disasm': 'lazy'}
+# Columns smaller than this are read into memory, mapping them costs more than reading them
+MMAP_MIN_BYTES = 64 * 1024
+
+# Parsed datasets, keyed by file name without extension. Every entry stores the source and mtime of the
+# file it was read from, its size in memory, the frame itself and whether it holds every column that is not
+# lazy (callers asking for some columns only get those parsed), and the dict is kept in LRU order. Datasets
+# indexed by one of their columns are kept in the same dict and budget, keyed by (name, column), and are
+# evicted together with their dataset.
+_cache = OrderedDict()
+_cache_bytes = 0
+_hits = 0
+_misses = 0
+_lock = threading.Lock()
+# (version, rows) of every dataset parsed, which the catalog reports for CSVs it only described from their header
+_row_counts = {}
+# (mtime, source) of the schema of every columnar copy, see _columnar_source
+_schema_sources = {}
+# Interned values of the key columns
+_keys = {}
+# Datasets accessed while track_dependencies is active. It is a context variable rather than thread-local
+# state so that the loads a callback hands to workers.run_all are tracked too.
+_tracking = contextvars.ContextVar("dependencies", default=None)
+# Datasets being parsed, keyed by name, so that concurrent readers of the same file wait for a single parse
+_loading = {}
+# Version of every dataset found by the last scan of watcher.py. While the watcher runs, versions are read
+# from here instead of checking the files on every access, and _data_version counts the scans that found
+# a change.
+_scanned_versions = None
+_data_version = 0
+
+
+def dataset_path(name):
+    return DATA_PATH.joinpath(name + ".csv")
+
+
+def columnar_path(name, directory=None):
+    return (directory or COLUMNAR_PATH).joinpath(name)
+
+
+def write_columnar(name, df, directory=None, source=None):
+    # One .npy file per column, so numeric columns can be memory-mapped when read back. Columns with
+    # Python objects (strings, booleans mixed with NaN) are stored pickled and loaded in full. source is the
+    # os.stat of the CSV df was read from (taken before reading it), whose mtime and size are stored in the
+    # schema: the copy is only read while the CSV still has them.
+    path = columnar_path(name, directory)
+    path.mkdir(parents=True, exist_ok=True)
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column].to_numpy()
+        file_name = str(i) + ".npy"
+        np.save(path.joinpath(file_name), values, allow_pickle=values.dtype == object)
+        columns.append({"name": column, "dtype": str(values.dtype), "file": file_name})
+    # The schema is written last, so an interrupted conversion is never picked up by read_dataset
+    tmp_schema = path.joinpath(SCHEMA_FILE + ".tmp")
+    with open(tmp_schema, "w") as f:
+        json.dump({"columns": columns, "rows": len(df), "source": _stat_source(source)}, f)
+    os.replace(tmp_schema, path.joinpath(SCHEMA_FILE))
+
+
+def read_columnar(name, directory=None, usecols=None):
+    # usecols, as in pd.read_csv, is a function telling whether each column is read
+    path = columnar_path(name, directory)
+    with open(path.joinpath(SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    data = {}
+    for column in schema["columns"]:
+        if usecols is not None and not usecols(column["name"]):
+            continue
+        if column["dtype"] == "object":
+            data[column["name"]] = np.load(path.joinpath(column["file"]), allow_pickle=True)
+        elif schema["rows"] * np.dtype(column["dtype"]).itemsize < MMAP_MIN_BYTES:
+            data[column["name"]] = np.load(path.joinpath(column["file"]))
+        else:
+            data[column["name"]] = np.load(path.joinpath(column["file"]), mmap_mode="r")
+    return pd.DataFrame(data, index=pd.RangeIndex(schema["rows"]), copy=False)
+
+
+def _intern(values):
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    uniques = np.array([_keys.setdefault(value, value) if isinstance(value, str) else value for value in uniques],
+                       dtype=object)
+    return uniques[codes]
+
+
+def _smallest_integers(values):
+    # values in the smallest integer type that holds all of them, or unchanged if some are not integers
+    if values.dtype.kind == 'f':
+        if len(values) == 0 or not np.isfinite(values).all() or not (values == np.round(values)).all():
+            return values
+    elif values.dtype.kind != 'i':
+        return values
+    low, high = (values.min(), values.max()) if len(values) else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return values if values.dtype == dtype else values.astype(dtype)
+    return values
+
+
+def compact(df):
+    # Applies COLUMN_TYPES to a freshly parsed frame
+    data = {}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if COLUMN_TYPES.get(column) == 'key' and values.dtype == object:
+            data[column] = _intern(values)
+        else:
+            data[column] = _smallest_integers(values)
+    return pd.DataFrame(data, index=df.index, copy=False)
+
+
+def _stat_source(stat):
+    return None if stat is None else {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _columnar_source(name):
+    # (mtime of the schema, source stored in it) of the columnar copy, None if there is none. Schemas are only
+    # read again when their mtime changes.
+    schema_path = columnar_path(name).joinpath(SCHEMA_FILE)
+    try:
+        mtime = schema_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _schema_sources.get(name)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(schema_path) as f:
+                cached = _schema_sources[name] = (mtime, json.load(f).get("source"))
+        except (FileNotFoundError, ValueError):
+            return None
+    return cached
+
+
+def _locate(name):
+    # Returns the source to read the dataset from and its mtime. The columnar copy is only used while the CSV
+    # it was converted from has the mtime and size stored in its schema (or is gone): a CSV replaced by another
+    # one, even with an older mtime, is read as CSV until it is converted again.
+    csv_path = dataset_path(name)
+    try:
+        csv_stat = csv_path.stat()
+    except FileNotFoundError:
+        csv_stat = None
+    if USE_COLUMNAR_STORE:
+        columnar = _columnar_source(name)
+        if columnar is not None and (csv_stat is None or columnar[1] == _stat_source(csv_stat)):
+            return "columnar", columnar[0]
+    if csv_stat is None:
+        raise FileNotFoundError(csv_path)
+    return "csv", csv_stat.st_mtime_ns
+
+
+def dataset_version(name):
+    # Raises FileNotFoundError for a missing dataset. While the watcher scans data/, a dataset its last scan did
+    # not find is missing without looking at the disk.
+    if _scanned_versions is not None:
+        version = _scanned_versions.get(name)
+        if version is None:
+            raise FileNotFoundError(dataset_path(name))
+    else:
+        version = _locate(name)
+    dependencies = _tracking.get()
+    if dependencies is not None:
+        dependencies[name] = version
+    return version
+
+
+def track_missing(name):
+    # Records that a dataset was looked up while it did not exist, with None as its version, so that what was
+    # built without it is rebuilt once it appears
+    dependencies = _tracking.get()
+    if dependencies is not None:
+        dependencies.setdefault(name, None)
+
+
+def is_current(dependencies):
+    # Whether every dataset collected by track_dependencies still has the version it was read with. Without the
+    # watcher the catalog is never refreshed, so a dataset it was missing from stays missing for what is built
+    # from it, even once its file appears.
+    for name, version in dependencies.items():
+        if version is None and _scanned_versions is None:
+            track_missing(name)
+            continue
+        try:
+            current = tuple(dataset_version(name))
+        except FileNotFoundError:
+            track_missing(name)
+            current = None
+        if current != (None if version is None else tuple(version)):
+            return False
+    return True
+
+
+@contextlib.contextmanager
+def track_dependencies():
+    # Collects the name and version of every dataset read inside the block, None for the missing ones
+    previous = _tracking.get()
+    dependencies = {}
+    token = _tracking.set(dependencies)
+    try:
+        yield dependencies
+    finally:
+        if previous is not None:
+            previous.update(dependencies)
+        _tracking.reset(token)
+
+
+def _freeze(df):
+    # Frames are shared between callbacks, so their backing arrays are made read-only to make any
+    # accidental in-place write fail loudly instead of corrupting the cached copy
+    for block in df._mgr.blocks:
+        if isinstance(block.values, np.ndarray):
+            block.values.flags.writeable = False
+    return df
+
+
+def _drop(key):
+    global _cache_bytes
+    nbytes = _cache.pop(key)[1]
+    _cache_bytes -= nbytes
+
+
+def _evict(key):
+    # Drops a frame, and with a dataset the frames indexed from it
+    for cached in [cached for cached in _cache if cached == key or (isinstance(cached, tuple) and cached[0] == key)]:
+        _drop(cached)
+
+
+def _insert(key, version, df, complete):
+    global _cache_bytes
+    nbytes = int(df.memory_usage(deep=True).sum())
+    if key in _cache:
+        if _cache[key][0] != version:
+            # The frames indexed from the previous version of a dataset go with it
+            _evict(key)
+        else:
+            _drop(key)
+    _cache[key] = (version, nbytes, df, complete)
+    _cache_bytes += nbytes
+    while len(_cache) > 1 and (len(_cache) > DATASET_CACHE_MAX_ENTRIES or _cache_bytes > DATASET_CACHE_MAX_BYTES):
+        _evict(next(iter(_cache)))
+
+
+def _parse(name, source, usecols):
+    if source == "columnar":
+        return compact(read_columnar(name, usecols=usecols))
+    return compact(pd.read_csv(dataset_path(name), usecols=usecols))
+
+
+def _has_columns(entry, columns):
+    df, complete = entry[2], entry[3]
+    return complete if columns is None else all(column in df.columns for column in columns)
+
+
+def read_dataset(name, columns=None):
+    # Frame with at least the given columns of the dataset, or with all of them but the lazy ones when
+    # columns is None. Columns missing from the cached frame are parsed and added to it.
+    global _hits, _misses
+    version = dataset_version(name)
+    source = version[0]
+    with _lock:
+        entry = _cache.get(name)
+        if entry is not None and entry[0] != version:
+            entry = None
+        if entry is not None and _has_columns(entry, columns):
+            _hits += 1
+            _cache.move_to_end(name)
+            return entry[2].copy(deep=False)
+        loading = _loading.get(name)
+        parsing = loading is None or loading[0] != version
+        if parsing:
+            loading = _loading[name] = (version, threading.Event())
+            _misses += 1
+    if not parsing:
+        # Another thread is parsing this version: once it is done the frame is read from the cache
+        loading[1].wait()
+        return read_dataset(name, columns)
+    # Parse outside the lock so that a slow file does not block the other callbacks
+    try:
+        loaded = entry[2] if entry is not None else None
+        if columns is None:
+            wanted = lambda column: COLUMN_TYPES.get(column) != 'lazy' and (loaded is None or column not in loaded)
+        else:
+            wanted = lambda column: column in columns and (loaded is None or column not in loaded)
+        with timed("io"):
+            df = _parse(name, source, wanted)
+        if loaded is not None:
+            df = pd.concat([loaded, df], axis=1, copy=False)
+        df = _freeze(df)
+        with _lock:
+            _insert(name, version, df, columns is None or (entry is not None and entry[3]))
+            _row_counts[name] = (version, len(df))
+    finally:
+        with _lock:
+            if _loading.get(name) is loading:
+                del _loading[name]
+        loading[1].set()
+    return df.copy(deep=False)
+
+
+def read_indexed(name, column, columns=None):
+    # Rows with a repeated key are dropped, so lookups return the first row with each key
+    version = dataset_version(name)
+    key = (name, column)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version and _has_columns(entry, columns):
+            # The dataset is used too, as it would take the indexed frame with it when evicted
+            if name in _cache:
+                _cache.move_to_end(name)
+            _cache.move_to_end(key)
+            return entry[2]
+    df = read_dataset(name, None if columns is None else [column] + list(columns)).set_index(column)
+    df = _freeze(df[~df.index.duplicated(keep='first')])
+    with _lock:
+        _insert(key, version, df, columns is None)
+    return df
+
+
+def available_datasets():
+    # Names of every dataset under data/, either as CSV or as columnar copy
+    names = {path.stem for path in DATA_PATH.glob("*.csv")}
+    if USE_COLUMNAR_STORE:
+        names.update(path.parent.name for path in COLUMNAR_PATH.glob("*/" + SCHEMA_FILE))
+    return sorted(names)
+
+
+def scan_versions():
+    versions = {}
+    for name in available_datasets():
+        try:
+            versions[name] = _locate(name)
+        except FileNotFoundError:
+            pass  # Removed while scanning
+    return versions
+
+
+def update_scanned_versions(versions):
+    # Returns the datasets that were added or changed and the ones removed since the previous scan
+    global _scanned_versions, _data_version
+    previous = _scanned_versions or {}
+    changed = sorted(name for name, version in versions.items() if previous.get(name) != version)
+    removed = sorted(name for name in previous if name not in versions)
+    _scanned_versions = versions
+    if changed or removed:
+        _data_version += 1
+    return changed, removed
+
+
+def data_version():
+    return _data_version
+
+
+def loaded_rows(name):
+    # Row count of the dataset if it was parsed, from the version last found by the watcher when it runs
+    with _lock:
+        entry = _row_counts.get(name)
+    if entry is None or (_scanned_versions is not None and _scanned_versions.get(name) != entry[0]):
+        return None
+    return entry[1]
+
+
+def forget(name):
+    with _lock:
+        _evict(name)
+        _row_counts.pop(name, None)
+
+
+def preload():
+    for name in available_datasets():
+        read_dataset(name)
+
+
+def cache_info():
+    with _lock:
+        return {"hits": _hits, "misses": _misses, "entries": len(_cache), "bytes": _cache_bytes,
+                "max_entries": DATASET_CACHE_MAX_ENTRIES, "max_bytes": DATASET_CACHE_MAX_BYTES}
+
+
+def clear_cache():
+    global _cache_bytes, _hits, _misses
+    with _lock:
+        _cache.clear()
+        _row_counts.clear()
+        _cache_bytes = 0
+        _hits = 0
+        _misses = 0
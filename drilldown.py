@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from aggregates import OPTIMALITY_STATISTICS
+from catalog import has_dataset, has_results, records
+from datasets import dataset_version, read_dataset, read_indexed
+
+# Columns of the per-contract table, comparing the CAV'20 setup (syrup 1.0) with the final setup (syrup 2.0)
+# of a solver. A positive regression means syrup 2.0 took more time or saved less gas.
+CONTRACT_COLUMNS = ['name', 'saved_gas_cav', 'saved_gas_syrup', 'time_cav', 'time_syrup', 'time_regression',
+                    'gas_regression'] + OPTIMALITY_STATISTICS
+# Columns of the per-block table of a blocks_<encoding> or comparison_<a>_<b> dataset. The disassembly of a
+# block is only read when asked for.
+BLOCK_COLUMNS = ['block_id', 'saved_gas', 'solver_time_in_sec', 'shown_optimal', 'no_model_found', 'init_progr_len',
+                 'final_progr_len', 'target_gas_cost', 'source_gas_cost']
+
+# Tables of the drill-down view keyed by ("contracts", solver) or ("blocks", dataset name), stored with the
+# versions of the datasets they are built from and the sort orders computed so far, keyed by (column,
+# descending). Once a column has its order, any page sorted by it costs the rows it shows.
+_tables = {}
+# Orders restricted to the rows matching a name filter, keyed by (table key, filter, column, descending)
+_filtered = OrderedDict()
+FILTERED_MAX_ENTRIES = 64
+_lock = threading.Lock()
+
+
+def block_datasets():
+    # Names of the datasets with one row per block
+    return sorted(name for name, record in records().items() if record["kind"] in ("blocks", "comparison"))
+
+
+def _sources(key):
+    kind, name = key
+    if kind == "contracts":
+        return ["CAV_" + name, "final_setup_" + name]
+    return [name]
+
+
+def _contract_table(solver):
+    if not has_results("CAV", solver) or not has_results("final_setup", solver):
+        return pd.DataFrame({column: [] for column in CONTRACT_COLUMNS})
+    cav = read_indexed("CAV_" + solver, 'name', ['saved_gas', 'time'])
+    syrup = read_indexed("final_setup_" + solver, 'name', ['saved_gas', 'time'] + OPTIMALITY_STATISTICS)
+    # Contracts in both setups, in the order of the CAV results as in plot_bar_comparison
+    common = cav.index[cav.index.isin(syrup.index)]
+    cav = cav.loc[common]
+    syrup = syrup.loc[common]
+    table = pd.DataFrame({'name': common.to_numpy(),
+                          'saved_gas_cav': cav['saved_gas'].to_numpy(),
+                          'saved_gas_syrup': syrup['saved_gas'].to_numpy(),
+                          'time_cav': cav['time'].to_numpy(),
+                          'time_syrup': syrup['time'].to_numpy()})
+    table['time_regression'] = table['time_syrup'] - table['time_cav']
+    table['gas_regression'] = table['saved_gas_cav'] - table['saved_gas_syrup']
+    for statistic in OPTIMALITY_STATISTICS:
+        table[statistic] = syrup[statistic].to_numpy()
+    return table
+
+
+def _block_table(name):
+    df = read_dataset(name, BLOCK_COLUMNS)
+    return pd.DataFrame({column: df[column].to_numpy() for column in BLOCK_COLUMNS if column in df.columns})
+
+
+def _table(key):
+    # (table, orders) of the key, rebuilt when any of its datasets changes
+    versions = [dataset_version(name) for name in _sources(key) if has_dataset(name)]
+    with _lock:
+        entry = _tables.get(key)
+    if entry is not None and entry[0] == versions:
+        return entry[1], entry[2]
+    table = _contract_table(key[1]) if key[0] == "contracts" else _block_table(key[1])
+    with _lock:
+        _tables[key] = (versions, table, {})
+        for filtered_key in [filtered_key for filtered_key in _filtered if filtered_key[0] == key]:
+            del _filtered[filtered_key]
+    return table, _tables[key][2]
+
+
+def _order(table, orders, column, descending):
+    # Row positions sorted by column (in file order when column is None), missing values last in both
+    # directions
+    if (column, descending) not in orders:
+        if column is None:
+            orders[(column, descending)] = np.arange(len(table))
+        else:
+            order = table[column].sort_values(ascending=not descending, na_position='last', kind='stable').index
+            orders[(column, descending)] = order.to_numpy()
+    return orders[(column, descending)]
+
+
+def _matching_order(key, table, orders, query, column, descending):
+    order = _order(table, orders, column, descending)
+    if not query:
+        return order
+    filtered_key = (key, query, column, descending)
+    with _lock:
+        matching = _filtered.get(filtered_key)
+        if matching is not None:
+            _filtered.move_to_end(filtered_key)
+            return matching
+    # The contract or block name is the first column of every table
+    names = table.iloc[:, 0].to_numpy()
+    matches = pd.Series(names[order]).str.contains(query, case=False, regex=False).to_numpy(dtype=bool)
+    matching = order[matches]
+    with _lock:
+        _filtered[filtered_key] = matching
+        while len(_filtered) > FILTERED_MAX_ENTRIES:
+            _filtered.popitem(last=False)
+    return matching
+
+
+def page(key, column=None, descending=False, page_number=0, page_size=20, query=""):
+    # Rows of one page of a table sorted by column and filtered by a case-insensitive substring of the
+    # contract or block name, and the number of rows matching the filter
+    table, orders = _table(key)
+    order = _matching_order(key, table, orders, query, column, descending)
+    positions = order[page_number * page_size:(page_number + 1) * page_size]
+    rows = table.iloc[positions]
+    return rows.astype(object).where(rows.notna(), None).to_dict('records'), len(order)
+
+
+def top_k(key, column, k=10, largest=True):
+    # The k rows with the largest (or smallest) values of column, e.g. top_k(("contracts", "z3"),
+    # "time_regression") for the contracts that regressed the most in time between syrup 1.0 and 2.0
+    return page(key, column, largest, 0, k)[0]
+
+
+def disassembly(name, block_id):
+    # Disassembled code of a block, read from the dataset only when asked for
+    blocks = read_indexed(name, 'block_id', ['target_disasm'])
+    if block_id not in blocks.index:
+        return None
+    return blocks.at[block_id, 'target_disasm']
+
+
+def clear_cache():
+    with _lock:
+        _tables.clear()
+        _filtered.clear()
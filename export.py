@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# Renders every figure the dashboard can show into static files, so the results can be published without
+# running the server. Figures are rendered by a pool of processes, and a manifest.json lists the file of
+# every figure with the inputs and the datasets it was built from.
+#
+#   python3 export.py --output site/ [--formats json,html,png] [--processes 4]
+#
+# The checklist sections (encodings, final comparison, stage two) are exported with every solver and
+# encoding selected. Their entry in the manifest carries what assets/filter_script.js needs to show any
+# selection of them in the browser, and filter_script.js is copied next to the manifest.
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import plots
+from datasets import track_dependencies
+from settings import PATH
+
+FORMATS = ["json", "html", "png"]
+
+
+def figure_path(section, figure, args):
+    # <section>/<figure>--<inputs>, with "all" standing for a whole checklist
+    values = ["all" if isinstance(value, (list, tuple)) else str(value) for value in args]
+    return pathlib.PurePosixPath(section, "--".join([figure] + values))
+
+
+def export_groups(selected_sections=None):
+    # Figures of every section as groups of (section, figure, plot function, args). The figures of a group
+    # read the same datasets, so they are rendered one after the other by the same process.
+    # app is only imported here, the processes rendering the figures do not need it.
+    import app
+    options = app.dropdown_options()
+    solvers = app.in_canonical_order(app.option_values(options['solver']), app.solver_order)
+    checklists = {
+        'encodings': app.in_canonical_order(app.option_values(options['encoding']), app.encoding_order),
+        'final-comparison': app.in_canonical_order(app.option_values(options['final_encoding']),
+                                                   app.final_encoding_order),
+        'stage-two': app.timeout_order(app.option_values(options['timeout'])),
+    }
+    groups = []
+    selections = {}
+    for section, encodings in checklists.items():
+        groups.append([(section, figure, function, (solvers, encodings)) for figure, function in
+                       [('time', 'plot_time'), ('gas', 'plot_gas'), ('statistics', 'plot_statistics')]])
+        selections[section] = app.trace_labels(solvers, encodings)
+    groups.append([('stage-two', figure, function, (solvers, checklists['stage-two'])) for figure, function in
+                   [('sweep', 'plot_timeout_sweep'), ('ecdf', 'plot_time_ecdf')]])
+    for default_encoding in app.option_values(options['default_encoding']):
+        for encoding in app.option_values(options['compared_encoding']):
+            groups.append([('parameters', 'comparison', 'plot_comparison', (default_encoding, encoding, comparison))
+                           for comparison in app.option_values(app.comparison_options)])
+    for parameter in app.option_values(app.configuration_options):
+        groups.append([('configurations', 'total-time', 'plot_configuration_comparison', (parameter,))])
+    for solver in solvers:
+        groups.append([('stage-three', 'statistics', 'plot_statistics_pie_chart', (solver,)),
+                       ('stage-three', 'gas-comparison', 'plot_bar_comparison', (solver, 'saved_gas')),
+                       ('stage-three', 'time-comparison', 'plot_bar_comparison', (solver, 'time'))])
+    if selected_sections:
+        groups = [group for group in groups if group[0][0] in selected_sections]
+        selections = {section: labels for section, labels in selections.items() if section in selected_sections}
+    return groups, selections
+
+
+def render_group(group, output, formats):
+    # Runs in a pool process, whose dataset and aggregate caches are kept from one group to the next
+    entries = []
+    for section, figure, function, args in group:
+        with track_dependencies() as dependencies:
+            fig = getattr(plots, function)(*args)
+        path = figure_path(section, figure, args)
+        output.joinpath(section).mkdir(parents=True, exist_ok=True)
+        files = {}
+        for file_format in formats:
+            file_path = path.with_suffix("." + file_format)
+            if file_format == "json":
+                output.joinpath(file_path).write_text(fig.to_json())
+            elif file_format == "html":
+                fig.write_html(output.joinpath(file_path), include_plotlyjs="cdn")
+            else:
+                fig.write_image(output.joinpath(file_path))
+            files[file_format] = str(file_path)
+        entries.append({"section": section, "figure": figure, "function": function, "inputs": list(args),
+                        "files": files, "dependencies": dependencies})
+    return entries
+
+
+def export(output, formats=("json", "html"), processes=None, sections=None):
+    # Writes the figures of the given sections (all of them by default) and the manifest into output
+    output = pathlib.Path(output).resolve()
+    output.mkdir(parents=True, exist_ok=True)
+    groups, selections = export_groups(sections)
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1 or len(groups) < 2:
+        results = [render_group(group, output, formats) for group in groups]
+    else:
+        # spawn, as in workers.py
+        with ProcessPoolExecutor(min(processes, len(groups)), mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(render_group, groups, [output] * len(groups), [formats] * len(groups)))
+    figures = [entry for entries in results for entry in entries]
+    for section, labels in selections.items():
+        labels['figures'] = {entry['figure']: entry['files'] for entry in figures if entry['section'] == section}
+    shutil.copy(PATH.joinpath("assets", "filter_script.js"), output.joinpath("filter_script.js"))
+    manifest = {"formats": list(formats), "figures": figures, "selections": selections}
+    output.joinpath("manifest.json").write_text(json.dumps(manifest, indent=1))
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export every figure of the dashboard to static files")
+    parser.add_argument("--output", required=True, help="folder to write the figures and manifest.json into")
+    parser.add_argument("--formats", default="json,html", help="comma separated formats among " + ",".join(FORMATS))
+    parser.add_argument("--processes", type=int, default=None, help="processes rendering figures (all cores)")
+    parser.add_argument("--sections", default=None, help="comma separated sections to export (all of them)")
+    args = parser.parse_args()
+    formats = args.formats.split(",")
+    if any(file_format not in FORMATS for file_format in formats):
+        parser.error("unknown format in " + args.formats)
+    if "png" in formats:
+        try:
+            import kaleido
+        except ImportError:
+            parser.error("png needs the kaleido package (pip install kaleido)")
+    manifest = export(args.output, formats, args.processes, args.sections.split(",") if args.sections else None)
+    print("Exported", len(manifest["figures"]), "figures into", pathlib.Path(args.output).resolve())
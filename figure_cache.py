@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+
+try:
+    # Several times faster than json at decoding the long number lists of the figures
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+from catalog import catalog_digest
+from datasets import is_current, track_dependencies
+from metrics import timed
+from settings import FIGURE_CACHE_MAX_ENTRIES, FIGURE_CACHE_MAX_BYTES, FIGURE_CACHE_DIR, FIGURE_CACHE_DISK_MAX_BYTES
+
+# Serialized figures keyed by (plot function, normalized inputs). Every entry also stores the version of
+# the datasets the figure was built from (None for those it found missing), and it is only served while all
+# of them are unchanged. Files of the disk cache are also keyed by the datasets listed in the catalog.
+_cache = OrderedDict()
+_cache_bytes = 0
+_hits = 0
+_disk_hits = 0
+_misses = 0
+_lock = threading.Lock()
+
+
+def _normalize(value):
+    # Callback inputs arrive as JSON values, lists are turned into tuples to make them hashable
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    return value
+
+
+def _disk_path(key):
+    return pathlib.Path(FIGURE_CACHE_DIR).joinpath(hashlib.sha1(repr(key).encode()).hexdigest() + ".json")
+
+
+def _read_disk(key):
+    path = _disk_path(key)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if entry["key"] != repr(key) or not is_current(entry["dependencies"]):
+        return None
+    os.utime(path)
+    return entry["dependencies"], entry["figure"]
+
+
+def _write_disk(key, dependencies, figure_json):
+    path = _disk_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp" + str(os.getpid()))
+    with open(tmp_path, "w") as f:
+        json.dump({"key": repr(key), "dependencies": dependencies, "figure": figure_json}, f)
+    os.replace(tmp_path, path)
+    # Least recently used files are removed once the folder goes over its size limit
+    entries = sorted((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+                     for entry in os.scandir(path.parent) if entry.name.endswith(".json"))
+    total = sum(size for _, size, _ in entries)
+    for _, size, file_path in entries:
+        if total <= FIGURE_CACHE_DISK_MAX_BYTES:
+            break
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _insert(key, dependencies, figure_json):
+    global _cache_bytes
+    if key in _cache:
+        _cache_bytes -= len(_cache.pop(key)[1])
+    _cache[key] = (dependencies, figure_json)
+    _cache_bytes += len(figure_json)
+    while len(_cache) > 1 and (len(_cache) > FIGURE_CACHE_MAX_ENTRIES or _cache_bytes > FIGURE_CACHE_MAX_BYTES):
+        _cache_bytes -= len(_cache.popitem(last=False)[1][1])
+
+
+def cached_figure(plot_function, *args):
+    # Returns the figure built by plot_function(*args) as a dict ready to be sent by a callback
+    global _hits, _disk_hits, _misses
+    key = (plot_function.__name__, _normalize(args))
+    with _lock:
+        entry = _cache.get(key)
+    if entry is not None and is_current(entry[0]):
+        with _lock:
+            _hits += 1
+            if key in _cache:
+                _cache.move_to_end(key)
+        with timed("serialize"):
+            return loads(entry[1])
+    if FIGURE_CACHE_DIR is not None:
+        disk_key = key + (catalog_digest(),)
+        entry = _read_disk(disk_key)
+        if entry is not None:
+            with _lock:
+                _disk_hits += 1
+                _insert(key, *entry)
+            with timed("serialize"):
+                return loads(entry[1])
+    with _lock:
+        _misses += 1
+    with track_dependencies() as dependencies:
+        figure = plot_function(*args)
+    with timed("serialize"):
+        figure_json = figure.to_json()
+    with _lock:
+        _insert(key, dependencies, figure_json)
+    if FIGURE_CACHE_DIR is not None:
+        _write_disk(disk_key, dependencies, figure_json)
+    with timed("serialize"):
+        return loads(figure_json)
+
+
+def invalidate(names):
+    # Drops the figures built from any of the given datasets
+    global _cache_bytes
+    names = set(names)
+    with _lock:
+        for key in [key for key, entry in _cache.items() if names.intersection(entry[0])]:
+            _cache_bytes -= len(_cache.pop(key)[1])
+
+
+def cache_info():
+    with _lock:
+        return {"hits": _hits, "disk_hits": _disk_hits, "misses": _misses, "entries": len(_cache),
+                "bytes": _cache_bytes, "max_entries": FIGURE_CACHE_MAX_ENTRIES, "max_bytes": FIGURE_CACHE_MAX_BYTES,
+                "directory": FIGURE_CACHE_DIR}
+
+
+def clear_cache():
+    global _cache_bytes, _hits, _disk_hits, _misses
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
+        _hits = 0
+        _disk_hits = 0
+        _misses = 0
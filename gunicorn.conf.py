@@ -0,0 +1,26 @@
+# gunicorn settings, read by `gunicorn -c gunicorn.conf.py app:server` (see Procfile)
+import os
+import shutil
+import tempfile
+
+# The app, with every dataset loaded and aggregated, is imported once in the master before forking, so
+# all the workers share a single copy of the data through copy-on-write pages
+preload_app = os.environ.get("SYRUP_PRELOAD_DATA", "1") == "1"
+os.environ.setdefault("SYRUP_PRELOAD_DATA", "1" if preload_app else "0")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# The browser polls a background job (see jobs.py) through any worker, so they all keep their jobs in one folder
+job_dir = None if os.environ.get("SYRUP_JOB_DIR") else tempfile.mkdtemp(prefix="syrup-jobs-")
+if job_dir is not None:
+    os.environ["SYRUP_JOB_DIR"] = job_dir
+
+
+def pre_fork(server, worker):
+    import workers
+    workers.prepare_fork()
+
+
+def on_exit(server):
+    if job_dir is not None:
+        shutil.rmtree(job_dir, ignore_errors=True)
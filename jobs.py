@@ -0,0 +1,325 @@
+import atexit
+import contextlib
+import contextvars
+import fcntl
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+from dash.exceptions import PreventUpdate
+from dash.long_callback.managers import BaseLongCallbackManager
+from plotly.io.json import to_json_plotly
+
+import workers
+from datasets import is_current, track_dependencies
+from settings import JOB_DIR, JOB_EXPIRE_SECONDS, JOB_THREADS
+
+# Background jobs of the expensive callbacks. A job runs on the "jobs" pool of workers.py in the process that
+# received the callback, and the browser polls it through any worker process of the server, so every job is a
+# folder of JOB_DIR named by the key Dash computes from the callback and its inputs:
+#   job.json     state (queued, running, done or cancelled), pid of the process running it, last progress and
+#                once done the version of every dataset it read
+#   result.json  outputs of the callback once done
+#   tickets/     a file per request waiting for the job, whose name is the job id sent to the browser
+# A request for inputs whose job is still queued or running, or done from datasets that did not change since,
+# gets a ticket on it instead of a new job. The
+# browser gives up the ticket of a request once a newer one supersedes it, and the job is cancelled when no
+# ticket is left. Every change to the folders is made under a lock file shared by the threads and processes.
+_default_root = None
+_pruned_at = 0
+_counts = {"submitted": 0, "coalesced": 0, "cancelled": 0, "finished": 0, "failed": 0}
+_lock = threading.Lock()
+# Folder of the job running in the current thread
+_current = contextvars.ContextVar("job", default=None)
+
+PRUNE_INTERVAL_SECONDS = 10
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _root():
+    global _default_root
+    if JOB_DIR is not None:
+        return pathlib.Path(JOB_DIR)
+    with _lock:
+        if _default_root is None:
+            _default_root = pathlib.Path(tempfile.mkdtemp(prefix="syrup-jobs-"))
+            atexit.register(shutil.rmtree, _default_root, True)
+        return _default_root
+
+
+@contextlib.contextmanager
+def _locked():
+    root = _root()
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root.joinpath(".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield root
+
+
+def _count(name):
+    with _lock:
+        _counts[name] += 1
+
+
+def _read_state(path):
+    try:
+        with open(path.joinpath("job.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, NotADirectoryError, ValueError):
+        return None
+
+
+def _write_state(path, previous, **changes):
+    state = dict(previous, updated=time.time(), **changes)
+    tmp_path = path.joinpath("job.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path.joinpath("job.json"))
+    return state
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _active(state):
+    # Queued or running in a process that is still there
+    return state is not None and state["state"] in ("queued", "running") and _alive(state["pid"])
+
+
+def _has_tickets(path):
+    return any(path.joinpath("tickets").iterdir())
+
+
+def _prune(root):
+    # Removes the jobs finished, cancelled or lost (their process exited) for more than JOB_EXPIRE_SECONDS
+    global _pruned_at
+    now = time.time()
+    if now - _pruned_at < PRUNE_INTERVAL_SECONDS:
+        return
+    _pruned_at = now
+    for path in root.iterdir():
+        if not path.is_dir():
+            continue
+        state = _read_state(path)
+        updated = state["updated"] if state is not None else path.stat().st_mtime
+        if not _active(state) and now - updated > JOB_EXPIRE_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _job_key(job):
+    return job.rsplit("-", 1)[0]
+
+
+def submit(key, function, args):
+    # Job id of a new ticket on the job computing function(*args), started unless the job of key is already
+    # queued or running, or done from the current datasets with a result still waiting for its tickets
+    job = key + "-" + uuid.uuid4().hex
+    with _locked() as root:
+        _prune(root)
+        path = root.joinpath(key)
+        state = _read_state(path)
+        done = state is not None and state["state"] == "done" and is_current(state["dependencies"])
+        start = not _active(state) and not done
+        if start:
+            # A new job, or one cancelled or lost whose tickets (if any) get the outputs of this one
+            path.joinpath("tickets").mkdir(parents=True, exist_ok=True)
+            path.joinpath("result.json").unlink(missing_ok=True)
+            _write_state(path, {}, state="queued", pid=os.getpid(), progress=None)
+        path.joinpath("tickets", job).touch()
+    _count("submitted" if start else "coalesced")
+    if start:
+        workers.submit(_run_job, (function, key, args))
+    return job
+
+
+def _remove_if_cancelled(path, state):
+    if state is not None and state["state"] == "cancelled":
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _finish(path, content, dependencies):
+    # Stores the outputs of the job, unless it was cancelled while running
+    with _locked():
+        state = _read_state(path)
+        if state is None or state["state"] != "running" or state["pid"] != os.getpid():
+            _remove_if_cancelled(path, state)
+            return
+        path.joinpath("result.json").write_bytes(content)
+        _write_state(path, state, state="done", dependencies=dependencies)
+    _count("finished")
+
+
+def _run_job(function, key, args):
+    path = _root().joinpath(key)
+    with _locked():
+        state = _read_state(path)
+        if state is None or state["state"] != "queued":
+            # Cancelled before it started
+            _remove_if_cancelled(path, state)
+            return
+        _write_state(path, state, state="running")
+    token = _current.set(path)
+    try:
+        with track_dependencies() as dependencies:
+            outputs = function(**args) if isinstance(args, dict) else function(*args)
+    except PreventUpdate:
+        outputs = {"_dash_no_update": "_dash_no_update"}
+    except JobCancelled:
+        with _locked():
+            _remove_if_cancelled(path, _read_state(path))
+        return
+    except Exception as error:
+        # Raised by Dash when the browser polls the job
+        outputs = {"long_callback_error": {"msg": str(error), "tb": traceback.format_exc()}}
+        _count("failed")
+    finally:
+        _current.reset(token)
+    _finish(path, to_json_plotly(outputs).encode(), dependencies)
+
+
+def cancelled():
+    # Whether the job running in the current thread was cancelled, False outside a job
+    path = _current.get()
+    if path is None:
+        return False
+    state = _read_state(path)
+    return state is None or state["state"] == "cancelled"
+
+
+def report_progress(*values):
+    # Values of the progress outputs of the callback whose job runs in the current thread, nothing outside a job
+    path = _current.get()
+    if path is None:
+        return
+    with _locked():
+        state = _read_state(path)
+        if state is not None and state["state"] == "running":
+            _write_state(path, state, progress=list(values))
+
+
+def run_steps(function, arguments, kind="figures"):
+    # [function(*args) for args in arguments] for the steps of a job, reported as (steps done, steps) progress.
+    # Inside a job the steps run one after another, each one only once the job is known not to be cancelled,
+    # so a cancelled job stops with JobCancelled without computing the steps left (the loads of a step still
+    # run concurrently). Outside a job they run concurrently with workers.run_all.
+    arguments = list(arguments)
+    if _current.get() is None:
+        return workers.run_all(function, arguments, kind)
+    results = []
+    for args in arguments:
+        report_progress(len(results), len(arguments))
+        if cancelled():
+            raise JobCancelled()
+        results.append(function(*args))
+    report_progress(len(results), len(arguments))
+    return results
+
+
+def checked_by(check):
+    # Decorator of a background callback: check, called with the arguments of the callback in the request that
+    # fires it, raises PreventUpdate when there is nothing to compute, and then no job is submitted at all
+    def decorator(function):
+        function.job_check = check
+        return function
+    return decorator
+
+
+def give_up(job):
+    # Removes the ticket of a superseded request, and cancels its job when no other request waits for it
+    if not job:
+        return
+    with _locked() as root:
+        path = root.joinpath(_job_key(job))
+        path.joinpath("tickets", job).unlink(missing_ok=True)
+        if not path.joinpath("tickets").is_dir() or _has_tickets(path):
+            return
+        state = _read_state(path)
+        if _active(state):
+            _write_state(path, state, state="cancelled")
+            _count("cancelled")
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def job_state(key):
+    return _read_state(_root().joinpath(key))
+
+
+def take_result(key, job):
+    # Outputs of the finished job of key, None while it runs. The job is removed once every ticket took them.
+    with _locked() as root:
+        path = root.joinpath(key)
+        state = _read_state(path)
+        if state is None or state["state"] != "done":
+            return None
+        content = path.joinpath("result.json").read_bytes()
+        if job:
+            path.joinpath("tickets", job).unlink(missing_ok=True)
+        if not _has_tickets(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return loads(content)
+
+
+def job_info():
+    root = _root()
+    with _lock:
+        return dict(_counts, threads=JOB_THREADS, directory=str(root))
+
+
+class JobManager(BaseLongCallbackManager):
+    # Background callback manager of Dash running the jobs described above. The callbacks report their progress
+    # with report_progress (or run_steps) instead of a set_progress argument, so they keep their signature and
+    # can still be called directly.
+    def __init__(self):
+        super().__init__(None)
+
+    def make_job_fn(self, fn, progress, key=None):
+        return fn
+
+    def call_job_fn(self, key, job_fn, args, context):
+        check = getattr(job_fn, "job_check", None)
+        if check is not None:
+            check(**args) if isinstance(args, dict) else check(*args)
+        return submit(key, job_fn, args)
+
+    def job_running(self, job):
+        return bool(job) and _active(job_state(_job_key(job)))
+
+    def terminate_job(self, job):
+        give_up(job)
+
+    def terminate_unhealthy_job(self, job):
+        return False
+
+    def get_progress(self, key):
+        state = job_state(key)
+        return state["progress"] if _active(state) else None
+
+    def result_ready(self, key):
+        state = job_state(key)
+        return state is not None and state["state"] == "done"
+
+    def get_result(self, key, job):
+        outputs = take_result(key, job)
+        return self.UNDEFINED if outputs is None else outputs
@@ -0,0 +1,146 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+
+from settings import SLOW_CALLBACK_SECONDS
+
+# Histogram buckets, in seconds, of the callback and request latencies
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# Histogram buckets, in bytes, of the response payloads
+SIZE_BUCKETS = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+
+slow_logger = logging.getLogger("slow_callbacks")
+
+# Summaries are [count, sum] and histograms [buckets, bucket counts, count, sum], keyed by (metric, labels)
+_summaries = {}
+_histograms = {}
+_lock = threading.Lock()
+# Name of the callback being run, to attribute the stages it goes through, and the stage the code runs in, as
+# a [time spent in the stages nested in it] cell. Both are context variables, so that they follow the work
+# handed to workers.run_all.
+_callback = contextvars.ContextVar("callback", default=None)
+_stage = contextvars.ContextVar("stage", default=None)
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe_summary(metric, value, **labels):
+    key = (metric, _labels(**labels))
+    with _lock:
+        summary = _summaries.setdefault(key, [0, 0.0])
+        summary[0] += 1
+        summary[1] += value
+
+
+def observe_histogram(metric, value, buckets, **labels):
+    key = (metric, _labels(**labels))
+    with _lock:
+        histogram = _histograms.setdefault(key, [buckets, [0] * len(buckets), 0, 0.0])
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[1][i] += 1
+        histogram[2] += 1
+        histogram[3] += value
+
+
+def current_callback():
+    return _callback.get() or "none"
+
+
+@contextlib.contextmanager
+def timed(stage):
+    # Adds the time spent inside the block to the given stage of the current callback. Stages can be nested
+    # (reading a dataset while building a figure): each one only counts the time not spent in the stages nested
+    # in it, including those run on the threads of workers.run_all, so the stages of a callback add up to its
+    # time. Nested stages running concurrently can add up to more than their parent, which then counts less
+    # than nothing.
+    parent = _stage.get()
+    token = _stage.set([0.0])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = _stage.get()[0]
+        _stage.reset(token)
+        if parent is not None:
+            with _lock:
+                parent[0] += elapsed
+        observe_summary("syrup_stage_seconds", elapsed - nested, stage=stage, callback=current_callback())
+
+
+def instrumented(stage):
+    # Decorator version of timed
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_callback(function):
+    # Records the latency of a Dash callback, and logs its inputs when it is slower than SLOW_CALLBACK_SECONDS
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _callback.set(function.__name__)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _callback.reset(token)
+            observe_histogram("syrup_callback_seconds", elapsed, LATENCY_BUCKETS, callback=function.__name__)
+            if SLOW_CALLBACK_SECONDS and elapsed > SLOW_CALLBACK_SECONDS:
+                slow_logger.warning("%s took %.3fs with inputs %s", function.__name__, elapsed,
+                                    json.dumps([args, kwargs], default=str))
+    return wrapper
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(key + '="' + str(value).replace('"', '\\"') + '"' for key, value in labels) + "}"
+
+
+def render(gauges=()):
+    # Prometheus text exposition of every metric, plus the given (name, help, {labels: value}) gauges
+    lines = []
+    with _lock:
+        summaries = sorted(_summaries.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+    typed = set()
+    for (metric, labels), (count, total) in summaries:
+        if metric not in typed:
+            lines.append("# TYPE " + metric + " summary")
+            typed.add(metric)
+        lines.append(metric + "_count" + _format_labels(labels) + " " + str(count))
+        lines.append(metric + "_sum" + _format_labels(labels) + " " + repr(total))
+    for (metric, labels), (buckets, counts, count, total) in histograms:
+        if metric not in typed:
+            lines.append("# TYPE " + metric + " histogram")
+            typed.add(metric)
+        for bound, bucket_count in zip(buckets, counts):
+            lines.append(metric + "_bucket" + _format_labels(labels + (("le", bound),)) + " " + str(bucket_count))
+        lines.append(metric + "_bucket" + _format_labels(labels + (("le", "+Inf"),)) + " " + str(count))
+        lines.append(metric + "_count" + _format_labels(labels) + " " + str(count))
+        lines.append(metric + "_sum" + _format_labels(labels) + " " + repr(total))
+    for metric, description, values in gauges:
+        lines.append("# HELP " + metric + " " + description)
+        lines.append("# TYPE " + metric + " gauge")
+        for labels, value in values.items():
+            lines.append(metric + _format_labels(labels) + " " + str(value))
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _summaries.clear()
+        _histograms.clear()
@@ -0,0 +1,127 @@
+import threading
+
+import numpy as np
+
+from catalog import blocks_name, comparison_name
+from datasets import read_dataset, read_indexed, dataset_version
+from metrics import timed
+
+
+def expected_size(df):
+    # Program length lower bound, with blocks whose bound is 0 counted as 1
+    inferred_size = df['inferred_size'].to_numpy()
+    return np.where(inferred_size == 0, 1, inferred_size)
+
+
+# Metrics of the comparison dropdown, computed from a frame with the columns of the comparison files. A new
+# metric only needs an entry here.
+COMPARISON_METRICS = {
+    'init_progr_len': lambda df: df['init_progr_len'].to_numpy(),
+    'initial_size_relation': lambda df: df['initial_size_relation'].to_numpy(),
+    'number_of_necessary_push': lambda df: df['number_of_necessary_push'].to_numpy(),
+    'number_of_necessary_uninterpreted_instructions':
+        lambda df: df['number_of_necessary_uninterpreted_instructions'].to_numpy(),
+    'push_per_initial': lambda df: df['number_of_necessary_push'].to_numpy() / df['init_progr_len'].to_numpy(),
+    'uninterpreted_per_initial':
+        lambda df: df['number_of_necessary_uninterpreted_instructions'].to_numpy() / df['init_progr_len'].to_numpy(),
+    'push_per_expected': lambda df: df['number_of_necessary_push'].to_numpy() / expected_size(df),
+    'uninterpreted_per_expected':
+        lambda df: df['number_of_necessary_uninterpreted_instructions'].to_numpy() / expected_size(df),
+}
+
+# Columns the metrics are computed from
+COMPARISON_COLUMNS = ['init_progr_len', 'initial_size_relation', 'number_of_necessary_push',
+                      'number_of_necessary_uninterpreted_instructions', 'inferred_size']
+# Columns telling which encoding works better on a block
+BLOCK_RESULT_COLUMNS = ['saved_gas', 'solver_time_in_sec']
+
+# Comparison metrics of the blocks in which each encoding of a pair works better, keyed by (first, second)
+# and stored with the versions of the datasets they were computed from
+_comparisons = {}
+# Every comparison metric of a dataset, keyed by name and stored with its version
+_metric_columns = {}
+_lock = threading.Lock()
+
+
+def select_comparison(df, comparison_category):
+    return COMPARISON_METRICS[comparison_category](df)
+
+
+def _metrics(df):
+    metrics = {}
+    for metric, compute in COMPARISON_METRICS.items():
+        metrics[metric] = compute(df)
+        metrics[metric].flags.writeable = False
+    return metrics
+
+
+def metric_columns(name):
+    # Every comparison metric of a dataset, derived once per version of the dataset
+    version = dataset_version(name)
+    with _lock:
+        entry = _metric_columns.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    df = read_dataset(name, COMPARISON_COLUMNS)
+    with timed("pandas"):
+        metrics = _metrics(df)
+    with _lock:
+        _metric_columns[name] = (version, metrics)
+    return metrics
+
+
+def _better_blocks(first_blocks, second_blocks):
+    # Joins the per-block results of both encodings on block_id. An encoding works better on a block when
+    # it saves more gas, or the same gas in less solver time (a block without solution saves nothing).
+    # Each side keeps the rows of its own results, as the precomputed comparison_<a>_<b> files do.
+    common = first_blocks.index[first_blocks.index.isin(second_blocks.index)]
+    first_blocks = first_blocks.loc[common]
+    second_blocks = second_blocks.loc[common]
+    first_gas = first_blocks['saved_gas'].fillna(-np.inf).to_numpy()
+    second_gas = second_blocks['saved_gas'].fillna(-np.inf).to_numpy()
+    first_time = first_blocks['solver_time_in_sec'].to_numpy()
+    second_time = second_blocks['solver_time_in_sec'].to_numpy()
+    first_better = (first_gas > second_gas) | ((first_gas == second_gas) & (first_time < second_time))
+    second_better = (second_gas > first_gas) | ((first_gas == second_gas) & (second_time < first_time))
+    return first_blocks[first_better], second_blocks[second_better]
+
+
+def _sources(first, second):
+    # Datasets the comparison is computed from: the per-block results of both encodings when available,
+    # otherwise the precomputed comparison files
+    if blocks_name(first) is not None and blocks_name(second) is not None:
+        return "blocks", [blocks_name(first), blocks_name(second)]
+    names = [comparison_name(first, second), comparison_name(second, first)]
+    return "comparison", [name for name in names if name is not None]
+
+
+def compare_encodings(first, second):
+    # Returns two dicts with every comparison metric, for the blocks in which first works better and for the
+    # blocks in which second works better
+    kind, names = _sources(first, second)
+    versions = [dataset_version(name) for name in names]
+    with _lock:
+        entry = _comparisons.get((first, second))
+    if entry is not None and entry[0] == (kind, names, versions):
+        return entry[1]
+    if kind == "blocks":
+        first_blocks = read_indexed(blocks_name(first), 'block_id', BLOCK_RESULT_COLUMNS + COMPARISON_COLUMNS)
+        second_blocks = read_indexed(blocks_name(second), 'block_id', BLOCK_RESULT_COLUMNS + COMPARISON_COLUMNS)
+        with timed("pandas"):
+            first_better, second_better = _better_blocks(first_blocks, second_blocks)
+            result = (_metrics(first_better), _metrics(second_better))
+    else:
+        empty = {metric: np.empty(0, dtype=float) for metric in COMPARISON_METRICS}
+        first_name, second_name = comparison_name(first, second), comparison_name(second, first)
+        result = (metric_columns(first_name) if first_name else empty,
+                  metric_columns(second_name) if second_name else empty)
+    with _lock:
+        _comparisons[(first, second)] = ((kind, names, versions), result)
+        _comparisons[(second, first)] = ((kind, names[::-1], versions[::-1]), result[::-1])
+    return result
+
+
+def clear_cache():
+    with _lock:
+        _comparisons.clear()
+        _metric_columns.clear()
@@ -1,14 +1,20 @@
-import itertools
+import logging
 
 import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
-import pathlib
-import plotly.express as px
+from plotly.colors import sample_colorscale
 from plotly.subplots import make_subplots
 
-PATH = pathlib.Path(__file__).parent
-DATA_PATH = (PATH.joinpath("data")).resolve()
+from aggregates import OPTIMALITY_STATISTICS, SWEEP_TIME_EDGES, optimality_rows, optimality_totals, sweep_rows
+from catalog import has_dataset, has_results
+from datasets import read_dataset, read_indexed
+from metrics import instrumented
+from pairwise import compare_encodings
+from settings import PRECOMPUTED_BOXES, BOX_MAX_POINTS
+from workers import run_all
+
+logger = logging.getLogger(__name__)
 encoding_names = {'initial_configuration': "O'<sub>SFS</sub> + C<sub>L</sub><br>(Initial encoding)",
                   "no_output_before_pop":  "O'<sub>SFS</sub> + C<sub>L</sub> + C<sub>R</sub>",
                   'at_most':  "O'<sub>SFS</sub> + C<sub>L</sub> + C<sub>U</sub>",
@@ -38,62 +44,125 @@ solver_name_abbreviated = {"combined": "port", "z3": "z3", "oms": "oms", "barcel
 
 solver_name = {"combined": "Portfolio", "z3": "Z3", "oms": "OMS", "barcelogic": "Barcelogic"}
 
-def plot_time(folder_name, encodings):
+def _sample(values, max_points):
+    # Evenly spaced picks over the sorted values, so the extremes are always kept and the result is stable
+    if len(values) <= max_points:
+        return values
+    return np.sort(values)[np.linspace(0, len(values) - 1, max_points).round().astype(int)]
+
+
+def box_statistics(values, max_points=BOX_MAX_POINTS, all_points=False):
+    # Same statistics Plotly computes in the browser: quartiles, fences at the last sample within 1.5 IQR
+    # and the points outside them (or every point when all_points is set), sampled down to max_points
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    points = values if all_points else values[(values < inside.min()) | (values > inside.max())]
+    return {'q1': q1, 'median': median, 'q3': q3, 'lowerfence': inside.min(), 'upperfence': inside.max(),
+            'mean': values.mean(), 'points': _sample(points, max_points)}
+
+
+def box_trace(values, labels=None, precomputed=None, **kwargs):
+    # go.Box over values grouped by labels. In precomputed mode only the statistics of every box are sent to
+    # the browser, so the size of the figure no longer depends on the number of values.
+    if precomputed is None:
+        precomputed = PRECOMPUTED_BOXES
+    if not precomputed:
+        return go.Box(y=values, x=labels, **kwargs)
+    values = np.asarray(values, dtype=float)
+    if labels is None:
+        groups = [(None, values)]
+    else:
+        # Boxes are kept in order of first appearance, as Plotly does with the raw values
+        labels = np.asarray(labels)
+        groups = [(key, values[labels == key]) for key in pd.unique(labels)]
+    all_points = kwargs.get('boxpoints') == 'all'
+    statistics = [(key, box_statistics(group, all_points=all_points)) for key, group in groups]
+    statistics = [(key, box) for key, box in statistics if box is not None]
+    kwargs.setdefault('boxpoints', 'outliers')
+    trace = go.Box(q1=[box['q1'] for _, box in statistics], median=[box['median'] for _, box in statistics],
+                   q3=[box['q3'] for _, box in statistics], lowerfence=[box['lowerfence'] for _, box in statistics],
+                   upperfence=[box['upperfence'] for _, box in statistics], mean=[box['mean'] for _, box in statistics],
+                   y=[box['points'] for _, box in statistics], **kwargs)
+    if labels is not None:
+        trace.x = [key for key, _ in statistics]
+    return trace
+
+
+def _metric_column(encoding, solver, metric):
+    if not has_results(encoding, solver):
+        return np.empty(0, dtype=float)
+    return read_dataset(encoding + "_" + solver, [metric])[metric].to_numpy()
+
+
+def metric_frame(folder_name, encodings, metric):
+    # Long-format frame with the value of metric for every contract of every (encoding, solver) pair, ordered
+    # by encoding and then by solver as given. Pairs without results contribute no rows. The datasets are
+    # loaded concurrently.
+    columns = run_all(_metric_column, [(encoding, name, metric) for encoding in encodings for name in folder_name])
+    lengths = [len(column) for column in columns]
+    pairs = np.arange(len(columns))
+    return pd.DataFrame({
+        'encoding': pd.Categorical.from_codes(np.repeat(pairs // max(len(folder_name), 1), lengths),
+                                              categories=list(encodings)),
+        'solver': pd.Categorical.from_codes(np.repeat(pairs % max(len(folder_name), 1), lengths),
+                                            categories=[solver_name.get(name, name) for name in folder_name]),
+        'value': np.concatenate(columns) if columns else np.empty(0, dtype=float)})
+
+
+def plot_metric(folder_name, encodings, metric, yaxis_title, scale=1):
+    frame = metric_frame(folder_name, encodings, metric)
+    values = frame['value'].to_numpy() / scale
+    labels = np.asarray(frame['solver'])
+    # Rows are grouped by encoding, so every trace is a contiguous slice of the frame
+    bounds = np.searchsorted(frame['encoding'].cat.codes.to_numpy(), np.arange(len(encodings) + 1))
     fig = go.Figure()
-    for encoding in encodings:
-        times = np.empty(0, dtype=float)
-        labels = []
-        for name in folder_name:
-            csv_name = str(DATA_PATH) + "/" + encoding + "_" + name + ".csv"
-            df = pd.read_csv(csv_name)
-            arr = df['time'].to_numpy() / 60
-            times = np.append(times, arr)
-            labels.extend([solver_name[name]] * len(arr))
-        fig.add_trace(go.Box(y=times, x=labels, name=encoding_names[encoding]))
+    for i, encoding in enumerate(encodings):
+        rows = slice(bounds[i], bounds[i + 1])
+        fig.add_trace(box_trace(values[rows], labels[rows], name=encoding_names.get(encoding, encoding)))
     fig.update_layout(
-        yaxis_title='Times per contract (minutes)',
+        yaxis_title=yaxis_title,
         boxmode='group'  # group together boxes of the different traces for each value of x
     )
     return fig
 
 
+def placeholder_figure(text="Loading..."):
+    # Blank figure with a centered message, shown by the graphs of a section before it is computed. It is
+    # a plain dict rather than a go.Figure so that the layout does not carry the default template per graph.
+    return {'data': [], 'layout': {'xaxis': {'visible': False}, 'yaxis': {'visible': False},
+                                   'annotations': [{'text': text, 'showarrow': False, 'xref': 'paper', 'yref': 'paper',
+                                                    'x': 0.5, 'y': 0.5, 'font': {'size': 16, 'color': 'grey'}}]}}
+
+
+@instrumented("figure")
+def plot_time(folder_name, encodings):
+    return plot_metric(folder_name, encodings, 'time', 'Times per contract (minutes)', scale=60)
+
+
+@instrumented("figure")
 def plot_gas(folder_name, encodings):
-    fig = go.Figure()
-    for encoding in encodings:
-        times = np.empty(0, dtype=float)
-        labels = []
-        for name in folder_name:
-            csv_name = str(DATA_PATH) + "/" + encoding + "_" + name + ".csv"
-            df = pd.read_csv(csv_name)
-            arr = df['saved_gas'].to_numpy()
-            times = np.append(times, arr)
-            labels.extend([solver_name[name]] * len(arr))
-        fig.add_trace(go.Box(y=times, x=labels, name=encoding_names[encoding]))
-    fig.update_layout(
-        yaxis_title='Saved gas per contract',
-        boxmode='group'  # group together boxes of the different traces for each value of x
-    )
-    return fig
+    return plot_metric(folder_name, encodings, 'saved_gas', 'Saved gas per contract')
+
+
+def statistics_pairs(folder_name, encodings):
+    # (encoding, solver) of every bar of plot_statistics, in order
+    return [(encoding, name) for name in folder_name for encoding in encodings if has_results(encoding, name)]
 
 
+@instrumented("figure")
 def plot_statistics(folder_name, encodings):
+    pairs = statistics_pairs(folder_name, encodings)
+    rows = optimality_rows(pairs)
+    labels_x = [solver_name_abbreviated.get(name, name) for _, name in pairs]
+    labels_y = [encoding_names_abbreviated.get(encoding, encoding) for encoding, _ in pairs]
     fig = go.Figure()
-    statistics = ['already_optimal', 'discovered_optimal', 'non_optimal_with_less_gas', 'non_optimal_with_same_gas',
-                  'no_solution_found']
-    for statistic in statistics:
-        labels_x = []
-        labels_y = []
-        results = []
-        for name in folder_name:
-            for encoding in encodings:
-                csv_name = str(DATA_PATH) + "/" + encoding + "_" + name + ".csv"
-                df = pd.read_csv(csv_name)
-                total_sum = 0
-                for other_statistics in statistics:
-                    total_sum += df[other_statistics].sum()
-                labels_x.append(solver_name_abbreviated[name])
-                labels_y.append(encoding_names_abbreviated[encoding])
-                results.append((df[statistic].sum() * 100) / total_sum)
+    for statistic in OPTIMALITY_STATISTICS:
+        results = [row[statistic + '_percentage'] for row in rows]
         fig.add_trace(go.Bar(y=results, x=[labels_x, labels_y], name=optimality_names[statistic]))
     fig.update_layout(
         yaxis_title='Comparison in outputs',
@@ -102,60 +171,81 @@ def plot_statistics(folder_name, encodings):
     return fig
 
 
-def select_comparison(df, comparison_category):
-    if comparison_category == "init_progr_len":
-        return df[comparison_category].to_numpy()
-    elif comparison_category == "initial_size_relation":
-        return df[comparison_category].to_numpy()
-    elif comparison_category == "number_of_necessary_push":
-        return df[comparison_category].to_numpy()
-    elif comparison_category == "number_of_necessary_uninterpreted_instructions":
-        return df[comparison_category].to_numpy()
-    elif comparison_category == "push_per_initial":
-        return df["number_of_necessary_push"].to_numpy() / df["init_progr_len"].to_numpy()
-    elif comparison_category == "uninterpreted_per_initial":
-        return df["number_of_necessary_uninterpreted_instructions"].to_numpy() / df["init_progr_len"].to_numpy()
-    elif comparison_category == "push_per_expected":
-        expected_size = np.array(list(map(lambda x: 1 if x == 0 else x, df['inferred_size'])))
-        return df["number_of_necessary_push"].to_numpy() / expected_size
-    elif comparison_category == "uninterpreted_per_expected":
-        expected_size = np.array(list(map(lambda x: 1 if x == 0 else x, df['inferred_size'])))
-        return df["number_of_necessary_uninterpreted_instructions"].to_numpy() / expected_size
+@instrumented("figure")
+def plot_timeout_sweep(folder_name, timeouts):
+    # Blocks solved to optimality and saved gas against the timeout, a line per solver. Every run is reduced
+    # once by sweep_rows, so the figure costs a point per run however many contracts there are.
+    rows = sweep_rows(statistics_pairs(folder_name, timeouts))
+    fig = make_subplots(rows=1, cols=2, subplot_titles=["Blocks solved to optimality (%)", "Saved gas"])
+    for name in folder_name:
+        solver_rows = [row for row in rows if row['solver'] == name]
+        for column, metric in enumerate(['solved_percentage', 'saved_gas']):
+            fig.add_trace(go.Scatter(x=[row['timeout'] for row in solver_rows], y=[row[metric] for row in solver_rows],
+                                     customdata=[row['encoding'] for row in solver_rows], meta={'solver': name},
+                                     mode='lines+markers', name=solver_name.get(name, name), legendgroup=name,
+                                     showlegend=column == 0), 1, column + 1)
+    fig.update_xaxes(type='log', title_text='Timeout (s)')
+    return fig
+
+
+@instrumented("figure")
+def plot_time_ecdf(folder_name, timeouts):
+    # Cumulative percentage of contracts finished within a time, a line per run colored by its timeout and
+    # dashed by its solver, binned on SWEEP_TIME_EDGES
+    rows = sweep_rows(statistics_pairs(folder_name, timeouts))
+    colors = sample_colorscale('Viridis', len(timeouts)) if len(timeouts) > 1 else ['#440154']
+    dashes = ['solid', 'dash', 'dot', 'dashdot', 'longdash', 'longdashdot']
+    traces = []
+    for row in rows:
+        # Only the part of the curve between its first contract and its last one is drawn
+        within = row['contracts_within']
+        start = max(int(np.argmax(within > 0)) - 1, 0)
+        end = int(np.argmax(within >= within[-1])) + 1
+        traces.append(go.Scatter(x=SWEEP_TIME_EDGES[start:end], y=within[start:end].round(2), mode='lines',
+                                 name=row['encoding'] + " " + solver_name.get(row['solver'], row['solver']),
+                                 line=dict(color=colors[timeouts.index(row['encoding'])],
+                                           dash=dashes[folder_name.index(row['solver']) % len(dashes)]),
+                                 meta={'solver': row['solver'], 'encoding': row['encoding']}))
+    fig = go.Figure(data=traces)
+    fig.update_layout(xaxis_type='log', xaxis_title='Time per contract (s)',
+                      yaxis_title='Contracts finished within the time (%)')
+    return fig
 
 
+@instrumented("figure")
 def plot_comparison(cat1, cat2, relation):
-    csv_name1 = str(DATA_PATH) + "/" + "comparison_" + cat1 + "_" + cat2 + ".csv"
-    csv_name2 = str(DATA_PATH) + "/" + "comparison_" + cat2 + "_" + cat1 + ".csv"
-    y1 = select_comparison(pd.read_csv(csv_name1), relation)
-    y2 = select_comparison(pd.read_csv(csv_name2), relation)
+    first_better, second_better = compare_encodings(cat1, cat2)
+    y1 = first_better[relation]
+    y2 = second_better[relation]
     fig = go.Figure()
-    fig.add_trace(go.Box(y=y1, name="Default encoding<br>works better", boxpoints='all', marker_size=3))
-    fig.add_trace(go.Box(y=y2, name="Selected encoding<br>works better", boxpoints='all', marker_size=3))
+    fig.add_trace(box_trace(y1, name="Default encoding<br>works better", boxpoints='all', marker_size=3))
+    fig.add_trace(box_trace(y2, name="Selected encoding<br>works better", boxpoints='all', marker_size=3))
     fig.update_layout(yaxis_title="Comparison between encodings")
     return fig
 
 
+@instrumented("figure")
 def plot_configuration_comparison(category_comparison):
-    csv_name = str(DATA_PATH) + "/" + category_comparison + "_parameter_comparison.csv"
-    df = pd.read_csv(csv_name)
-    x = [encoding_names[encoding] for encoding in df['name'].to_list()]
-    y = df['time'].to_list()
+    name = category_comparison + "_parameter_comparison"
+    if has_dataset(name):
+        df = read_dataset(name, ['name', 'time'])
+        x = [encoding_names.get(encoding, encoding) for encoding in df['name'].to_list()]
+        y = df['time'].to_list()
+    else:
+        x, y = [], []
     fig = go.Figure(data=[go.Bar(x=x, y=y)])
     fig.update_layout(yaxis_title="Total time in minutes")
     return fig
 
 
+@instrumented("figure")
 def plot_statistics_pie_chart(solver):
-    syrup_csv_name = str(DATA_PATH) + "/final_setup_" + solver + ".csv"
-    cav_csv_name = str(DATA_PATH) + "/CAV_" + solver + ".csv"
-    labels = ['already_optimal', 'discovered_optimal', 'non_optimal_with_less_gas',
-              'non_optimal_with_same_gas', 'no_solution_found']
-    labels_to_desplay = [optimality_names[name] for name in labels]
-    cav_df = pd.read_csv(cav_csv_name).sum()
-    syrup_df = pd.read_csv(syrup_csv_name).sum()
+    labels_to_desplay = [optimality_names[name] for name in OPTIMALITY_STATISTICS]
+    cav_totals = optimality_totals("CAV", solver) if has_results("CAV", solver) else None
+    syrup_totals = optimality_totals("final_setup", solver) if has_results("final_setup", solver) else None
 
-    cav_values = [cav_df[label] for label in labels]
-    syrup_values = [syrup_df[label] for label in labels]
+    cav_values = [cav_totals[label] for label in OPTIMALITY_STATISTICS] if cav_totals else []
+    syrup_values = [syrup_totals[label] for label in OPTIMALITY_STATISTICS] if syrup_totals else []
 
     fig = make_subplots(rows=1, cols=2, specs=[[{'type': 'domain'}, {'type': 'domain'}]])
     fig.add_trace(go.Pie(labels=labels_to_desplay, values=cav_values, name="CAV'20 Setup"),
@@ -174,26 +264,33 @@ def plot_statistics_pie_chart(solver):
     return fig
 
 
+def indexed_column(encoding, solver, column):
+    # Column of a result file indexed by contract name, empty when there are no such results
+    if not has_results(encoding, solver):
+        return pd.Series([], index=pd.Index([], name='name'), name=column, dtype=float)
+    return read_indexed(encoding + "_" + solver, 'name', [column])[column]
+
+
+@instrumented("figure")
 def plot_bar_comparison(solver, category_name):
-    syrup_csv_name = str(DATA_PATH) + "/final_setup_" + solver + ".csv"
-    cav_csv_name = str(DATA_PATH) + "/CAV_" + solver + ".csv"
-    cav_rows = pd.read_csv(cav_csv_name).to_dict('records')
-    syrup_rows = pd.read_csv(syrup_csv_name).to_dict('records')
-    labels = list(range(len(syrup_rows)))
-    cav_values = []
-    syrup_values = []
-    for i, cav_row in enumerate(cav_rows):
-        block_name = cav_row['name']
-        syrup_row = list(filter(lambda row: row['name'] == block_name, syrup_rows))[0]
-        if category_name == "time":
-            cav_values.append(cav_row[category_name] / 60)
-            syrup_values.append(syrup_row[category_name] / 60)
-        else:
-            cav_values.append(cav_row[category_name])
-            syrup_values.append(syrup_row[category_name])
-    fig = go.Figure(data=[go.Bar(name="syrup 1.0", x=labels, y=cav_values),
-                          go.Bar(name='syrup 2.0', x=labels, y=syrup_values)])
+    cav_values = indexed_column("CAV", solver, category_name)
+    syrup_values = indexed_column("final_setup", solver, category_name)
+    # Contracts are matched by name, keeping the order of the CAV results
+    joined = pd.concat([cav_values.rename('cav'), syrup_values.rename('syrup')], axis=1, join='inner')
+    only_cav = cav_values.index.difference(syrup_values.index)
+    only_syrup = syrup_values.index.difference(cav_values.index)
+    if len(only_cav) or len(only_syrup):
+        logger.warning("%s: %d contracts only in CAV_%s, %d only in final_setup_%s", category_name,
+                       len(only_cav), solver, len(only_syrup), solver)
+    if category_name == "time":
+        joined = joined / 60
+    labels = list(range(len(joined)))
+    fig = go.Figure(data=[go.Bar(name="syrup 1.0", x=labels, y=joined['cav'].to_numpy()),
+                          go.Bar(name='syrup 2.0', x=labels, y=joined['syrup'].to_numpy())])
     fig.update_layout(barmode='group', font_size=16, yaxis_title=analyzed_parameters_names[category_name] + ' per contract',)
+    if len(only_cav) or len(only_syrup):
+        fig.update_layout(title_text=str(len(joined)) + " contracts in both setups (" + str(len(only_cav)) +
+                                     " only in syrup 1.0, " + str(len(only_syrup)) + " only in syrup 2.0)")
     if category_name == "time":
         fig.update_layout(yaxis_type="log")
     return fig
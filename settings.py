@@ -0,0 +1,56 @@
+import os
+import pathlib
+
+PATH = pathlib.Path(__file__).parent
+DATA_PATH = pathlib.Path(os.environ.get("SYRUP_DATA_PATH", PATH.joinpath("data"))).resolve()
+# Binary copy of the CSVs written by convert_data.py, preferred over the CSV when it is up to date
+COLUMNAR_PATH = DATA_PATH.joinpath("columnar")
+USE_COLUMNAR_STORE = os.environ.get("SYRUP_USE_COLUMNAR_STORE", "1") == "1"
+
+# Bounds of the in-process dataset cache (see datasets.py)
+DATASET_CACHE_MAX_ENTRIES = int(os.environ.get("SYRUP_DATASET_CACHE_MAX_ENTRIES", 128))
+DATASET_CACHE_MAX_BYTES = int(os.environ.get("SYRUP_DATASET_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Serialized figures kept by figure_cache.py. Setting SYRUP_FIGURE_CACHE_DIR adds an on-disk level shared by
+# every worker process of the server.
+FIGURE_CACHE_MAX_ENTRIES = int(os.environ.get("SYRUP_FIGURE_CACHE_MAX_ENTRIES", 256))
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("SYRUP_FIGURE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+FIGURE_CACHE_DIR = os.environ.get("SYRUP_FIGURE_CACHE_DIR") or None
+FIGURE_CACHE_DISK_MAX_BYTES = int(os.environ.get("SYRUP_FIGURE_CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024))
+
+# Box plots send quartiles, fences and at most BOX_MAX_POINTS sample points per box instead of every value
+PRECOMPUTED_BOXES = os.environ.get("SYRUP_PRECOMPUTED_BOXES", "0") == "1"
+BOX_MAX_POINTS = int(os.environ.get("SYRUP_BOX_MAX_POINTS", 500))
+
+# Load and aggregate every dataset when app.py is imported. gunicorn.conf.py turns it on together with
+# preload_app, so the data is read once in the master and shared by the forked workers.
+PRELOAD_DATA = os.environ.get("SYRUP_PRELOAD_DATA", "0") == "1"
+
+# Seconds between two scans of data/ looking for new or changed datasets (0 disables the watcher). Without
+# the watcher, changed datasets are still picked up when read, but the catalog is only built once: datasets
+# added or removed after the server started are ignored until it restarts.
+WATCH_INTERVAL = float(os.environ.get("SYRUP_WATCH_INTERVAL", 10))
+
+# Callbacks slower than this many seconds get their inputs logged to the "slow_callbacks" logger (0 disables it)
+SLOW_CALLBACK_SECONDS = float(os.environ.get("SYRUP_SLOW_CALLBACK_SECONDS", 0))
+
+# JSON responses (callback outputs, layout) of at least COMPRESS_MIN_BYTES are sent with brotli when the
+# brotli package is installed and the browser accepts it, and gzip otherwise
+COMPRESS_RESPONSES = os.environ.get("SYRUP_COMPRESS_RESPONSES", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("SYRUP_COMPRESS_MIN_BYTES", 1024))
+
+# Threads per process loading datasets and building the figures of a callback concurrently (1 runs everything
+# in the callback's thread), and worker processes for the CPU-bound aggregations (0 computes them in threads)
+WORKER_THREADS = int(os.environ.get("SYRUP_WORKER_THREADS", 8))
+WORKER_PROCESSES = int(os.environ.get("SYRUP_WORKER_PROCESSES", 0))
+
+# The figure sets of stages one to three are computed by background jobs (see jobs.py) on JOB_THREADS threads per
+# process, which the browser polls every JOB_POLL_MILLISECONDS (SYRUP_BACKGROUND_CALLBACKS=0 computes them in the
+# callback request instead). Jobs are kept in JOB_DIR, a temporary folder of the process when unset, which
+# gunicorn.conf.py shares between the workers. Finished jobs whose result nobody fetched are removed after
+# JOB_EXPIRE_SECONDS.
+BACKGROUND_CALLBACKS = os.environ.get("SYRUP_BACKGROUND_CALLBACKS", "1") == "1"
+JOB_THREADS = int(os.environ.get("SYRUP_JOB_THREADS", 2))
+JOB_POLL_MILLISECONDS = int(os.environ.get("SYRUP_JOB_POLL_MILLISECONDS", 100))
+JOB_DIR = os.environ.get("SYRUP_JOB_DIR") or None
+JOB_EXPIRE_SECONDS = float(os.environ.get("SYRUP_JOB_EXPIRE_SECONDS", 300))
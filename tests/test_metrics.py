@@ -0,0 +1,50 @@
+import pathlib
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import metrics
+import workers
+
+
+def stage_totals():
+    return {dict(labels)["stage"]: total for (metric, labels), (_, total) in metrics._summaries.items()
+            if metric == "syrup_stage_seconds"}
+
+
+def test_stages_run_by_run_all_add_up_to_the_wall_time():
+    metrics.reset()
+    threads = set()
+    # The loads are serialized, so that the time of the nested stages cannot add up to more than the figure
+    lock = threading.Lock()
+
+    def load(seconds):
+        with lock, metrics.timed("io"):
+            threads.add(threading.current_thread().name)
+            time.sleep(seconds)
+
+    start = time.perf_counter()
+    with metrics.timed("figure"):
+        time.sleep(0.02)
+        workers.run_all(load, [(0.01,)] * 4)
+    wall = time.perf_counter() - start
+    totals = stage_totals()
+    assert threading.current_thread().name not in threads
+    assert totals["io"] >= 0.04
+    assert abs(totals["figure"] + totals["io"] - wall) < 0.002
+
+
+def test_nested_stages_in_the_same_thread_add_up_to_the_wall_time():
+    metrics.reset()
+    start = time.perf_counter()
+    with metrics.timed("figure"):
+        time.sleep(0.01)
+        with metrics.timed("io"):
+            time.sleep(0.01)
+        with metrics.timed("pandas"):
+            time.sleep(0.01)
+    wall = time.perf_counter() - start
+    totals = stage_totals()
+    assert totals["io"] >= 0.01 and totals["pandas"] >= 0.01
+    assert abs(sum(totals.values()) - wall) < 0.002
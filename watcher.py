@@ -0,0 +1,60 @@
+import logging
+import os
+import threading
+
+import catalog
+import datasets
+import figure_cache
+from aggregates import optimality_totals
+from settings import WATCH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+_thread = None
+_thread_pid = None
+_scanned = False
+_lock = threading.Lock()
+
+
+def refresh():
+    # Scans data/ once. Only the datasets that were added or changed are parsed again, together with their
+    # aggregates, and the figures built from them are dropped from the figure cache.
+    global _scanned
+    first_scan = not _scanned
+    changed, removed = datasets.update_scanned_versions(datasets.scan_versions())
+    _scanned = True
+    if first_scan or not (changed or removed):
+        return [], []
+    logger.info("Datasets changed: %s, removed: %s", changed, removed)
+    catalog.refresh(changed, removed)
+    for name in removed:
+        datasets.forget(name)
+    figure_cache.invalidate(changed + removed)
+    for name in changed:
+        datasets.read_dataset(name)
+        pair = catalog.split_result_name(name)
+        if pair is not None:
+            optimality_totals(*pair)
+    return changed, removed
+
+
+def _watch():
+    event = threading.Event()
+    while not event.wait(WATCH_INTERVAL):
+        try:
+            refresh()
+        except Exception:
+            logger.exception("Error while scanning the data folder")
+
+
+def ensure_started():
+    # Threads do not survive a fork, so every worker process starts its own watcher on its first request
+    global _thread, _thread_pid
+    if WATCH_INTERVAL <= 0 or (_thread_pid == os.getpid() and _thread.is_alive()):
+        return
+    with _lock:
+        if _thread_pid != os.getpid() or not _thread.is_alive():
+            refresh()
+            _thread = threading.Thread(target=_watch, name="data-watcher", daemon=True)
+            _thread.start()
+            _thread_pid = os.getpid()
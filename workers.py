@@ -0,0 +1,83 @@
+import contextvars
+import gc
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from settings import JOB_THREADS, WORKER_THREADS, WORKER_PROCESSES
+
+# Bounded pools shared by every callback of the process. Figures and loads have pools of their own, as a
+# figure waits for the loads it submits and a single pool could end up with every thread waiting. Background
+# jobs (see jobs.py) run on a third one, which bounds how many of them compute at the same time.
+_pools = {}
+_pools_pid = None
+_worker = threading.local()
+_lock = threading.Lock()
+
+
+def _run(kind, context, function, args):
+    # Runs in a pool thread, with the context variables (dependency tracking, current callback) of the caller
+    _worker.kind = kind
+    try:
+        return context.run(function, *args)
+    finally:
+        _worker.kind = None
+
+
+def _pool(kind):
+    # Pools do not survive a fork, so every worker process of the server creates its own
+    global _pools_pid
+    with _lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if kind not in _pools:
+            if kind == "processes":
+                # spawn, as forking a process with running threads can leave locks held in the child
+                _pools[kind] = ProcessPoolExecutor(WORKER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _pools[kind] = ThreadPoolExecutor(JOB_THREADS if kind == "jobs" else WORKER_THREADS,
+                                                  thread_name_prefix="syrup-" + kind)
+        return _pools[kind]
+
+
+def run_all(function, arguments, kind="loads"):
+    # [function(*args) for args in arguments], run concurrently on the pool of the given kind: "loads" and
+    # "figures" are thread pools, "processes" a process pool for CPU-bound work whose function and
+    # arguments can be pickled. Calls made from a thread of the same pool, or with a single item, run
+    # serially in the calling thread.
+    arguments = list(arguments)
+    if kind == "processes" and WORKER_PROCESSES <= 0:
+        kind = "loads"
+    if len(arguments) < 2 or (kind != "processes" and (WORKER_THREADS <= 1 or getattr(_worker, "kind", None) == kind)):
+        return [function(*args) for args in arguments]
+    pool = _pool(kind)
+    if kind == "processes":
+        futures = [pool.submit(function, *args) for args in arguments]
+    else:
+        futures = [pool.submit(_run, kind, contextvars.copy_context(), function, args) for args in arguments]
+    return [future.result() for future in futures]
+
+
+def submit(function, args, kind="jobs"):
+    # Runs function(*args) on the thread pool of the given kind without waiting for it, with the context
+    # variables of the caller
+    return _pool(kind).submit(_run, kind, contextvars.copy_context(), function, args)
+
+
+def shutdown(wait=False):
+    # With wait, returns once every thread of the pools has exited
+    with _lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=wait, cancel_futures=True)
+        _pools.clear()
+
+
+def prepare_fork():
+    # Called by a process that loaded the data before forking the workers of the server (see gunicorn.conf.py).
+    # Its thread pools are stopped first, so that no thread of theirs holds a lock copied into a worker (workers
+    # create pools of their own). Objects loaded so far are then moved out of the collector's reach, so
+    # collections in the workers do not write to (and copy) the pages holding them.
+    shutdown(wait=True)
+    gc.freeze()